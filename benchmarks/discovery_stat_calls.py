@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 the original author or authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Count the file system calls made by plugin path discovery.
+
+A synthetic plugin tree is generated in a temporary directory and placed at
+the end of a long ``sys.path`` of empty directories.  The discovery walk of
+the original implementation, which iterated ``sys.path`` again for every
+sub-namespace and made separate ``exists``/``isdir`` calls, is compared
+with the current one.
+
+Calls are counted by wrapping the functions that touch the file system;
+the types of ``os.scandir`` entries normally come from the directory listing
+itself and are not counted.
+
+::
+
+    $ python benchmarks/discovery_stat_calls.py --packages 40 --modules 50 --path-entries 200
+"""
+from argparse import ArgumentParser
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from livetribe.plugins import _collect_plugin_paths, _is_package
+from synthetic import COUNTED, counting, make_path_entries, make_tree
+
+
+def legacy_collect_plugin_paths(namespace, recurse=False, already_seen=None):
+    """The discovery walk as it was before namespace roots were resolved once."""
+    already_seen = set() if already_seen is None else already_seen
+
+    for sys_path in sys.path:
+        namespace_rel_path = namespace.replace(".", os.path.sep)
+        namespace_path = os.path.join(sys_path, namespace_rel_path)
+        if os.path.exists(namespace_path):
+            for candidate in os.listdir(namespace_path):
+                candidate_path = os.path.join(namespace_path, candidate)
+                if os.path.isdir(candidate_path):
+                    if not _is_package(candidate_path):
+                        continue
+                    if recurse:
+                        subns = '.'.join((namespace, candidate.split('.py')[0]))
+                        for path in legacy_collect_plugin_paths(subns, recurse, already_seen):
+                            yield path
+                else:
+                    base, ext = os.path.splitext(candidate)
+                    if base == '__init__' or ext != '.py':
+                        continue
+
+                candidate_namespace = os.path.join(namespace, candidate)
+                if candidate_namespace not in already_seen:
+                    already_seen.add(candidate_namespace)
+                    yield candidate_namespace
+
+
+def measure(label, walk):
+    with counting() as calls:
+        start = time.perf_counter()
+        found = sum(1 for _ in walk())
+        elapsed = time.perf_counter() - start
+
+    total = sum(calls.values())
+    details = ', '.join('%s=%d' % (name, calls[name]) for name in COUNTED)
+    print('%-28s %6d plugins %8d calls (%s) %8.3fs' % (label, found, total, details, elapsed))
+    return found
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--packages', type=int, default=40, help='sub-packages per package')
+    parser.add_argument('--modules', type=int, default=50, help='modules per package')
+    parser.add_argument('--depth', type=int, default=2, help='levels of sub-packages')
+    parser.add_argument('--path-entries', type=int, default=200, help='empty sys.path entries ahead of the tree')
+    options = parser.parse_args()
+
+    namespace = 'benchplugins.discovery'
+    root = tempfile.mkdtemp()
+    saved_path = list(sys.path)
+    try:
+        count = make_tree(os.path.join(root, 'tree'), namespace, options.packages, options.modules, options.depth)
+        sys.path[:0] = make_path_entries(root, options.path_entries)
+        sys.path.append(os.path.join(root, 'tree'))
+
+        print('%d plugins, %d sys.path entries' % (count, len(sys.path)))
+        legacy = measure('legacy walk', lambda: legacy_collect_plugin_paths(namespace, True))
+        current = measure('current walk', lambda: _collect_plugin_paths(namespace, True))
+
+        __import__(namespace)
+        imported = measure('current walk, __path__', lambda: _collect_plugin_paths(namespace, True))
+        assert legacy == current == imported
+    finally:
+        sys.path[:] = saved_path
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
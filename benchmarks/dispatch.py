@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 the original author or authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Compare dispatching an event to every plugin with and without a compiled dispatch table.
+
+A synthetic plugin tree, whose modules each export ``do()``, is generated in
+a temporary directory and imported once.  Dispatching events by iterating
+over ``collect_plugin_modules`` and calling ``getattr`` on each module, over
+a list of the collected modules, and through a :class:`PluginDispatch` are
+then timed.
+
+::
+
+    $ python benchmarks/dispatch.py --modules 150 --events 2000
+"""
+from argparse import ArgumentParser
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from livetribe.plugins import collect_plugin_modules, compile_plugin_dispatch
+from synthetic import make_tree
+
+
+def measure(label, dispatch, events, baseline=None):
+    start = time.perf_counter()
+    total = dispatch(events)
+    elapsed = time.perf_counter() - start
+
+    speedup = ' %6.1fx' % (baseline / elapsed) if baseline else ''
+    print('%-28s %10.3f us/event%s' % (label, elapsed / len(events) * 1e6, speedup))
+    return elapsed, total
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--modules', type=int, default=150, help='plugin modules')
+    parser.add_argument('--events', type=int, default=2000, help='events to dispatch')
+    options = parser.parse_args()
+
+    namespace = 'benchplugins.dispatch'
+    root = tempfile.mkdtemp()
+    saved_path = list(sys.path)
+    try:
+        make_tree(root, namespace, 0, options.modules, 1)
+        sys.path.insert(0, root)
+        events = list(range(options.events))
+
+        def rewalk(events):
+            total = 0
+            for event in events:
+                for module in collect_plugin_modules(namespace, ['do']):
+                    total += getattr(module, 'do')(event)
+            return total
+
+        modules = list(collect_plugin_modules(namespace, ['do']))
+
+        def iterate(events):
+            total = 0
+            for event in events:
+                for module in modules:
+                    total += getattr(module, 'do')(event)
+            return total
+
+        dispatch = compile_plugin_dispatch(namespace, 'do')
+
+        def call_all(events):
+            total = 0
+            for event in events:
+                total += sum(dispatch.call_all('do', event))
+            return total
+
+        def map_all(events):
+            return sum(sum(results) for results in dispatch.map_all('do', events))
+
+        print('%d plugins, %d events' % (len(modules), len(events)))
+        baseline, expected = measure('collect and getattr', rewalk, events)
+        for label, dispatcher in (('list and getattr', iterate), ('dispatch call_all', call_all),
+                                  ('dispatch map_all', map_all)):
+            _, total = measure(label, dispatcher, events, baseline)
+            assert total == expected
+    finally:
+        sys.path[:] = saved_path
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 the original author or authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Compare the host's resident memory after discovering heavy plugins in process and in isolation.
+
+A synthetic plugin tree is generated whose modules are large, and whose
+imports allocate a table each, standing in for plugins with heavy
+dependencies.  Plugin classes are then discovered in a fresh interpreter,
+either in process with ``collect_plugin_classes`` or in worker processes
+with ``collect_plugins_isolated``, and the resident set size of that
+interpreter is reported.  Peak resident set sizes are read with
+:mod:`resource` and are therefore only available on Unix.
+
+::
+
+    $ python benchmarks/isolated_rss.py --modules 40 --packages 10 --table-size 20000
+"""
+from argparse import ArgumentParser
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+SOURCES = os.path.join(BENCHMARKS, os.pardir, 'src')
+NAMESPACE = 'benchplugins.isolated'
+MODES = ('in_process', 'isolated')
+
+
+def _current_rss():
+    """Return the current resident set size in bytes, from ``/proc`` where there is one."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        return None
+
+
+def _peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_child(mode, tree):
+    """Discover the plugin classes in this interpreter, printing its memory use as JSON."""
+    sys.path.insert(0, SOURCES)
+    sys.path.insert(1, tree)
+    from livetribe.plugins import collect_plugin_classes, collect_plugins_isolated
+    base = __import__('benchbase').Base
+
+    before = _current_rss()
+    if mode == 'in_process':
+        found = len(list(collect_plugin_classes(NAMESPACE, subclasses_of=base, recurse=True)))
+    else:
+        found = len(collect_plugins_isolated(NAMESPACE, subclasses_of=base, recurse=True)[NAMESPACE]['classes'])
+
+    json.dump({
+        'found': found,
+        'rss_before': before,
+        'rss_after': _current_rss(),
+        'peak_rss': _peak_rss(),
+        'modules': len(sys.modules),
+    }, sys.stdout)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--packages', type=int, default=10, help='sub-packages per package')
+    parser.add_argument('--modules', type=int, default=40, help='modules per package')
+    parser.add_argument('--depth', type=int, default=2, help='levels of sub-packages')
+    parser.add_argument('--module-size', type=int, default=20, help='extra functions per module')
+    parser.add_argument('--table-size', type=int, default=20000, help='items each module allocates on import')
+    parser.add_argument('--child', choices=MODES, help='internal: discover in this interpreter')
+    parser.add_argument('--tree', help='internal: the generated tree')
+    options = parser.parse_args()
+
+    if options.child:
+        run_child(options.child, options.tree)
+        return
+
+    sys.path.insert(0, BENCHMARKS)
+    from synthetic import make_tree
+
+    root = tempfile.mkdtemp()
+    try:
+        count = make_tree(root, NAMESPACE, options.packages, options.modules, options.depth, options.module_size)
+        for directory, _, files in os.walk(os.path.join(root, *NAMESPACE.split('.'))):
+            for name in files:
+                if name.startswith('plugin'):
+                    with open(os.path.join(directory, name), 'a') as f:
+                        f.write('\nTABLE = [str(i) for i in range(%d)]\n' % options.table_size)
+
+        print('%d plugins, %d table items each' % (count, options.table_size))
+        print('%-12s %7s %8s %14s %14s %14s' % ('mode', 'found', 'modules', 'rss before', 'rss after', 'peak rss'))
+        for mode in MODES:
+            command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--tree', root]
+            measured = json.loads(subprocess.check_output(command).decode('utf-8'))
+            print('%-12s %7d %8d %14s %14s %14d' % (mode, measured['found'], measured['modules'],
+                                                    measured['rss_before'], measured['rss_after'],
+                                                    measured['peak_rss']))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 the original author or authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Measure the memory held per plugin by a resident catalog of discovery results.
+
+A synthetic plugin tree of about 10,000 plugins is generated in a temporary
+directory and discovered without importing anything.  The memory retained
+by the raw ``(plugin_path, source_path)`` pairs, by plugin handles and by
+plugin records is measured with ``tracemalloc``.
+
+::
+
+    $ python benchmarks/record_memory.py --packages 15 --modules 30 --depth 3
+"""
+from argparse import ArgumentParser
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from livetribe.plugins import _walk_plugin_paths, collect_plugin_handles, collect_plugin_records
+from synthetic import make_tree
+
+
+def measure(label, collect):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        catalog = list(collect())
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    print('%-20s %6d plugins %10d bytes %8.1f bytes/plugin' % (label, len(catalog), retained,
+                                                                retained / float(len(catalog))))
+    return len(catalog)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--packages', type=int, default=15, help='sub-packages per package')
+    parser.add_argument('--modules', type=int, default=30, help='modules per package')
+    parser.add_argument('--depth', type=int, default=3, help='levels of sub-packages')
+    options = parser.parse_args()
+
+    namespace = 'benchplugins.records'
+    root = tempfile.mkdtemp()
+    saved_path = list(sys.path)
+    try:
+        count = make_tree(root, namespace, options.packages, options.modules, options.depth)
+        sys.path.insert(0, root)
+
+        print('%d plugins' % count)
+        paths = measure('path pairs', lambda: _walk_plugin_paths(namespace, True))
+        handles = measure('handles', lambda: collect_plugin_handles(namespace, True))
+        records = measure('records', lambda: collect_plugin_records(namespace, True))
+        assert paths == handles == records
+    finally:
+        sys.path[:] = saved_path
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
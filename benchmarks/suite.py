@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 the original author or authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Benchmark plugin discovery and import over a synthetic plugin tree.
+
+Each public API is run in a fresh interpreter against a generated plugin
+tree, once cold and then again warm, i.e. with ``sys.modules`` populated by
+the first run.  Wall time, file system calls, peak memory allocated by
+Python and the number of modules imported are measured for each run.
+
+Results are written as JSON to ``benchmarks/results/<label>.json`` so that
+runs for different versions can be compared:
+
+::
+
+    $ python benchmarks/suite.py --label 1.0
+    $ python benchmarks/suite.py --label 1.1 --compare benchmarks/results/1.0.json
+"""
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+SOURCES = os.path.join(BENCHMARKS, os.pardir, 'src')
+NAMESPACE = 'benchplugins.suite'
+
+APIS = ('paths', 'handles', 'modules', 'classes', 'classes_static', 'instances')
+METRICS = ('seconds', 'calls', 'peak_bytes', 'imports')
+
+
+def _api(name):
+    import livetribe.plugins as plugins
+
+    def base():
+        return __import__('benchbase').Base
+
+    return {
+        'paths': lambda: plugins._collect_plugin_paths(NAMESPACE, True),
+        'handles': lambda: plugins.collect_plugin_handles(NAMESPACE, recurse=True),
+        'modules': lambda: plugins.collect_plugin_modules(NAMESPACE, recurse=True),
+        'classes': lambda: plugins.collect_plugin_classes(NAMESPACE, subclasses_of=base(), recurse=True),
+        'classes_static': lambda: plugins.collect_plugin_classes(NAMESPACE, subclasses_of=base(), recurse=True,
+                                                                 static=True),
+        'instances': lambda: plugins.instantiate_plugin_classes(
+            plugins.collect_plugin_classes(NAMESPACE, subclasses_of=base(), recurse=True), 1),
+    }[name]
+
+
+def run_child(api, tree, path_entries):
+    """Run one API cold and then warm in this interpreter, printing the measurements as JSON."""
+    sys.path.insert(0, SOURCES)
+    sys.path[1:1] = path_entries + [tree]
+    from synthetic import counting
+
+    results = {}
+    for run in ('cold', 'warm'):
+        call = _api(api)
+        modules_before = len(sys.modules)
+        tracemalloc.start()
+        with counting() as calls:
+            start = time.perf_counter()
+            found = sum(1 for _ in call())
+            seconds = time.perf_counter() - start
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[run] = {
+            'found': found,
+            'seconds': seconds,
+            'calls': sum(calls.values()),
+            'peak_bytes': peak_bytes,
+            'imports': len(sys.modules) - modules_before,
+        }
+
+    json.dump(results, sys.stdout)
+
+
+def run_suite(options):
+    sys.path.insert(0, BENCHMARKS)
+    from synthetic import make_path_entries, make_tree
+
+    root = tempfile.mkdtemp()
+    try:
+        tree = os.path.join(root, 'tree')
+        count = make_tree(tree, NAMESPACE, options.packages, options.modules, options.depth, options.module_size)
+        path_entries = make_path_entries(root, options.path_entries)
+
+        results = {
+            'label': options.label,
+            'python': platform.python_version(),
+            'parameters': {
+                'plugins': count,
+                'packages': options.packages,
+                'modules': options.modules,
+                'depth': options.depth,
+                'module_size': options.module_size,
+                'path_entries': options.path_entries,
+            },
+            'apis': {},
+        }
+        for api in options.apis:
+            command = [sys.executable, os.path.abspath(__file__), '--child', api, '--tree', tree,
+                       '--path-entries-json', json.dumps(path_entries)]
+            output = subprocess.check_output(command)
+            results['apis'][api] = json.loads(output.decode('utf-8'))
+    finally:
+        shutil.rmtree(root)
+
+    return results
+
+
+def report(results, baseline=None):
+    print('%d plugins, %d extra sys.path entries, Python %s' % (results['parameters']['plugins'],
+                                                                results['parameters']['path_entries'],
+                                                                results['python']))
+    print('%-16s %-5s %7s %10s %8s %12s %8s' % ('api', 'run', 'found', 'seconds', 'calls', 'peak bytes', 'imports'))
+    for api, runs in sorted(results['apis'].items()):
+        for run in ('cold', 'warm'):
+            measured = runs[run]
+            line = '%-16s %-5s %7d %10.4f %8d %12d %8d' % (api, run, measured['found'], measured['seconds'],
+                                                          measured['calls'], measured['peak_bytes'],
+                                                          measured['imports'])
+            previous = (baseline or {}).get('apis', {}).get(api, {}).get(run)
+            if previous:
+                changes = []
+                for metric in METRICS:
+                    if previous[metric]:
+                        changes.append('%s %+.0f%%' % (metric, 100.0 * (measured[metric] - previous[metric])
+                                                       / previous[metric]))
+                line += '   vs %s: %s' % (baseline['label'], ', '.join(changes))
+            print(line)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--label', default='latest', help='the label, e.g. the version, to store results under')
+    parser.add_argument('--output', help='the results file, default benchmarks/results/<label>.json')
+    parser.add_argument('--compare', help='a results file to compare against')
+    parser.add_argument('--packages', type=int, default=10, help='sub-packages per package')
+    parser.add_argument('--modules', type=int, default=20, help='modules per package')
+    parser.add_argument('--depth', type=int, default=2, help='levels of sub-packages')
+    parser.add_argument('--module-size', type=int, default=20, help='extra functions per module')
+    parser.add_argument('--path-entries', type=int, default=100, help='empty sys.path entries ahead of the tree')
+    parser.add_argument('--apis', nargs='+', default=list(APIS), choices=APIS, help='the APIs to benchmark')
+    parser.add_argument('--child', choices=APIS, help='internal: run one API in this interpreter')
+    parser.add_argument('--tree', help='internal: the generated tree')
+    parser.add_argument('--path-entries-json', help='internal: the generated sys.path entries')
+    options = parser.parse_args()
+
+    if options.child:
+        run_child(options.child, options.tree, json.loads(options.path_entries_json))
+        return
+
+    results = run_suite(options)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    output = options.output or os.path.join(BENCHMARKS, 'results', '%s.json' % options.label)
+    if not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('Results written to %s' % output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#
+# Copyright 2013 the original author or authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+"""Synthetic plugin trees and file system call counting for the benchmarks."""
+from collections import Counter
+import io
+import os
+
+try:
+    import posix as _os_module
+except ImportError:
+    import nt as _os_module
+
+
+COUNTED = ('stat', 'lstat', 'listdir', 'scandir', 'open_code')
+
+BASE_MODULE = 'benchbase'
+
+BASE_SOURCE = '''
+class Base(object):
+    def __init__(self, *args, **kwargs):
+        self.args = args
+'''
+
+
+def make_tree(root, namespace, packages, modules, depth, module_size=0):
+    """Write a plugin tree beneath root and return the number of plugins in it.
+
+    Each package holds `modules` modules and `packages` sub-packages, `depth`
+    levels deep.  Every module defines a plugin class deriving from
+    ``benchbase.Base`` and ``do()``, followed by `module_size` further
+    functions to make it costlier to compile and import.
+    """
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    with open(os.path.join(root, BASE_MODULE + '.py'), 'w') as f:
+        f.write(BASE_SOURCE)
+
+    segments = namespace.split('.')
+    for i in range(len(segments)):
+        directory = os.path.join(root, *segments[:i + 1])
+        os.makedirs(directory)
+        open(os.path.join(directory, '__init__.py'), 'w').close()
+
+    count = 0
+    levels = [os.path.join(root, *segments)]
+    for _ in range(depth):
+        next_levels = []
+        for directory in levels:
+            for i in range(modules):
+                with open(os.path.join(directory, 'plugin%04d.py' % i), 'w') as f:
+                    f.write(_module_source(i, module_size))
+                count += 1
+            for i in range(packages):
+                package = os.path.join(directory, 'package%04d' % i)
+                os.makedirs(package)
+                open(os.path.join(package, '__init__.py'), 'w').close()
+                next_levels.append(package)
+                count += 1
+        levels = next_levels
+
+    return count
+
+
+def _module_source(i, module_size):
+    lines = [
+        'from %s import Base' % BASE_MODULE,
+        '',
+        'class Plugin%04d(Base):' % i,
+        '    pass',
+        '',
+        'def do(value):',
+        '    return value + %d' % i,
+    ]
+    for j in range(module_size):
+        lines.extend(['', 'def helper%04d(value):' % j, '    return [value * %d for _ in range(%d)]' % (j, j)])
+    return '\n'.join(lines) + '\n'
+
+
+def make_path_entries(root, count):
+    """Create `count` empty directories to pad ``sys.path`` with and return their paths."""
+    entries = []
+    for i in range(count):
+        entry = os.path.join(root, 'entry%04d' % i)
+        os.makedirs(entry)
+        entries.append(entry)
+    return entries
+
+
+class counting(object):
+    """Count calls to the file system functions used by the library and the import system while in effect.
+
+    The import system calls the functions of the ``posix`` (or ``nt``)
+    module directly, so both it and ``os`` are wrapped.  Directory entry
+    types from ``scandir`` come with the listing and are not counted.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self.originals = []
+
+    def __enter__(self):
+        for name in COUNTED:
+            for module in (os, _os_module, io):
+                original = getattr(module, name, None)
+                if original is not None:
+                    self.originals.append((module, name, original))
+                    setattr(module, name, self._counted(name, original))
+        return self.calls
+
+    def __exit__(self, *exc_info):
+        for module, name, original in reversed(self.originals):
+            setattr(module, name, original)
+        self.originals = []
+
+    def _counted(self, name, original):
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return original(*args, **kwargs)
+        return counted
@@ -60,8 +60,8 @@ class doc(Command):
 
 
 class test(Command):
-    description = 'run nosetests'
-    user_options = [('verbose', 'v', 'run nosetests with -v option')]
+    description = 'run the tests with pytest'
+    user_options = [('verbose', 'v', 'run pytest with -v option')]
     boolean_options = ['verbose']
 
     def initialize_options(self):
@@ -71,27 +71,21 @@ class test(Command):
         pass
 
     def run(self):
+        command = [sys.executable, '-m', 'pytest']
         if self.verbose:
-            verbose = '-v'
-        else:
-            verbose = ''
+            command.append('-v')
 
-        status = subprocess.call(['nosetests', verbose])
+        status = subprocess.call(command)
 
         if status:
-            raise RuntimeError('nosetests step failed')
+            raise RuntimeError('pytest step failed')
 
 
 with open('requirements.txt') as f:
     install_requires = f.read().splitlines()
 
-try:
-    import importlib
-except ImportError:
-    install_requires.append('importlib')
-
 tests_requires = install_requires + [
-    'nose >= 1.2',
+    'pytest',
 ]
 
 setup(
@@ -111,10 +105,16 @@ setup(
 
     zip_safe=False,
     platforms='any',
+    python_requires='>=3.7',
     install_requires=install_requires,
 
+    entry_points={
+        'console_scripts': [
+            'livetribe-plugins-manifest = livetribe.plugins:main',
+        ],
+    },
+
     tests_require=tests_requires,
-    test_suite='nose.collector',
 
     classifiers=[
         'Intended Audience :: Developers',
@@ -122,10 +122,13 @@ setup(
         'License :: OSI Approved :: Apache Software License',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Topic :: Software Development :: Libraries :: Python Modules'
     ],
     cmdclass={'doc': doc, 'test': test},
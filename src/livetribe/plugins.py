@@ -14,15 +14,75 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+from argparse import ArgumentParser
 from logging import getLogger
+import ast
+import asyncio
+import builtins
+import errno
+import fnmatch
+import gc
+import hashlib
+import heapq
+import inspect
+import itertools
+import json
+import multiprocessing
 import os
+import pkgutil
+import stat
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import weakref
+import zipfile
 
-from importlib import import_module
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib import import_module, invalidate_caches, reload
+from importlib.machinery import SourceFileLoader
+from types import FunctionType, ModuleType
+
+try:
+    from importlib.metadata import entry_points as _entry_points
+except ImportError:
+    try:
+        from importlib_metadata import entry_points as _entry_points
+    except ImportError:
+        _entry_points = None
 
 
 log = getLogger(__name__)
 
+def _parent_classes(subclasses_of):
+    """Return the parent classes plugin classes must be children of as a tuple, or ``None`` for any class.
+
+    :param subclasses_of: a single parent class or collection of classes, or ``None``
+    """
+    if subclasses_of is None:
+        return None
+    try:
+        return tuple([subclass for subclass in subclasses_of])
+    except TypeError:
+        return (subclasses_of, )
+
+
+def _method_names(methods):
+    """Return the method names that plugin modules must export as a frozen set, or ``None`` for any module.
+
+    :param methods: a collection of method names, or ``None``
+    """
+    if not methods:
+        return None
+    try:
+        return frozenset([method_name for method_name in methods])
+    except TypeError:
+        return frozenset([methods])
+
+
 def instantiate_plugin_classes(plugin_classes, *args, **kwargs):
     """A generator function to instantiate plugin instances given a collection of plugin classes.
 
@@ -55,10 +115,280 @@ Otherwise, one can instantiate the plugin instances on an individual basis.
         instance.work()
    """
     for plugin_class in plugin_classes:
-        yield plugin_class(*args, **kwargs)
+        yield _construct_plugin(plugin_class, args, kwargs)
+
+
+def _construct_plugin(plugin_class, args, kwargs):
+    measurement = _listeners and _start_measurement()
+    instance = plugin_class(*args, **kwargs)
+    if measurement:
+        _notify(PHASE_INSTANTIATE, _class_name(plugin_class), *_stop_measurement(measurement))
+    return instance
+
+
+def instantiate_plugin_classes_concurrently(plugin_classes, args=(), kwargs=None, workers=None, processes=False):
+    """Instantiate plugin classes concurrently on a pool of threads or processes.
+
+    :param plugin_classes: a collection of plugin Python classes
+    :param args: arguments to pass to each constructor
+    :param kwargs: keyword arguments to pass to each constructor
+    :param workers: the size of the pool
+    :type workers: default None, i.e. the executor's default
+    :param processes: whether to use a pool of processes rather than threads
+    :type processes: default False
+    :rtype: a list of :class:`PluginInstantiation`, in the order of `plugin_classes`
+
+    The constructors of plugin classes that load models, compile tables and
+    the like can be spread across cores with ``processes=True``; the plugin
+    classes, arguments and the constructed instances must then be picklable
+    and each instance is a copy of the one constructed in the worker process.
+    A constructor that raises does not stop the others, its exception is
+    recorded in the returned :class:`PluginInstantiation`.
+
+    ::
+
+        from livetribe.plugins import collect_plugin_classes, instantiate_plugin_classes_concurrently
+        from acme.framework import Factory
+
+        plugin_classes = collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True)
+        for result in instantiate_plugin_classes_concurrently(plugin_classes, (2, 'test'), processes=True):
+            if result.error is None:
+                result.instance.work()
+    """
+    plugin_classes = list(plugin_classes)
+    kwargs = kwargs or {}
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+
+    with executor_class(max_workers=workers) as executor:
+        futures = [executor.submit(_instantiate_plugin_class, plugin_class, args, kwargs)
+                   for plugin_class in plugin_classes]
+
+        results = []
+        for plugin_class, future in zip(plugin_classes, futures):
+            try:
+                instance, seconds = future.result()
+                results.append(PluginInstantiation(plugin_class, instance, None, seconds))
+                if _listeners:
+                    _notify(PHASE_INSTANTIATE, _class_name(plugin_class), seconds, None)
+            except Exception as e:
+                log.warning('Problems instantiating %s', plugin_class)
+                log.debug('', exc_info=1)
+                results.append(PluginInstantiation(plugin_class, None, e, None))
+
+    return results
+
+
+def _instantiate_plugin_class(plugin_class, args, kwargs):
+    start = time.perf_counter()
+    instance = plugin_class(*args, **kwargs)
+    return instance, time.perf_counter() - start
+
+
+class PluginInstantiation(object):
+    """The outcome of instantiating a plugin class.
+
+    :ivar plugin_class: the plugin class
+    :ivar instance: the plugin instance, or ``None`` if instantiation failed
+    :ivar error: the exception raised while instantiating, or ``None``
+    :ivar seconds: the seconds the constructor took, or ``None`` if it failed
+    """
+
+    __slots__ = ('plugin_class', 'instance', 'error', 'seconds')
+
+    def __init__(self, plugin_class, instance, error, seconds):
+        self.plugin_class = plugin_class
+        self.instance = instance
+        self.error = error
+        self.seconds = seconds
+
+    def __repr__(self):
+        outcome = 'error=%r' % (self.error, ) if self.error is not None else 'instance=%r' % (self.instance, )
+        return '<PluginInstantiation %s %s>' % (self.plugin_class.__name__, outcome)
+
+
+def _instance_key(plugin_class, args, kwargs):
+    """Return the key of a plugin class and its constructor arguments, or ``None`` if they are unhashable.
+
+    The arguments' types are part of the key, as with ``functools.lru_cache(typed=True)``,
+    so that e.g. ``1``, ``1.0`` and ``True`` construct different instances.
+    """
+    kwargs = tuple(sorted(kwargs.items())) if kwargs else ()
+    key = (plugin_class, args, kwargs, tuple(type(arg) for arg in args),
+           tuple(type(value) for _, value in kwargs))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class PluginInstanceCache(object):
+    """A bounded cache of shared plugin instances, one for each plugin class and constructor arguments.
+
+    Instances are evicted, least recently used first, to keep the cache
+    within `max_size` instances.  Instances constructed with unhashable
+    arguments are not cached.  The instances are shared between callers,
+    and threads, so the plugins must be safe to share; see
+    :class:`PluginInstancePool` for plugins that are not.
+
+    ::
+
+        from livetribe.plugins import PluginInstanceCache, collect_plugin_classes
+        from acme.framework import Factory
+
+        cache = PluginInstanceCache(max_size=64)
+        plugin_classes = list(collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True))
+        for instance in cache.instantiate_plugin_classes(plugin_classes, 2, 'test', done=False):
+            instance.work()
+
+    :ivar max_size: the most instances that are cached
+    :ivar hits: the number of lookups that returned a cached instance
+    :ivar misses: the number of lookups that constructed an instance
+    :ivar evictions: the number of instances evicted to stay within `max_size`
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._instances = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._instances)
+
+    def get(self, plugin_class, *args, **kwargs):
+        """Return the cached instance of a plugin class for the arguments, constructing it if needed."""
+        key = _instance_key(plugin_class, args, kwargs)
+        if key is not None:
+            with self._lock:
+                instance = self._instances.get(key, _missing)
+                if instance is not _missing:
+                    self._instances.move_to_end(key)
+                    self.hits += 1
+                    return instance
+                self.misses += 1
+        else:
+            log.debug('Not caching %s, its arguments are unhashable', plugin_class)
+            with self._lock:
+                self.misses += 1
+
+        # constructors may be slow, so they are not run while holding the lock
+        instance = _construct_plugin(plugin_class, args, kwargs)
+        if key is None:
+            return instance
+
+        with self._lock:
+            # another thread may have constructed one meanwhile, keep the instance that was cached first
+            instance = self._instances.setdefault(key, instance)
+            self._instances.move_to_end(key)
+            while len(self._instances) > max(self.max_size, 0):
+                self._instances.popitem(last=False)
+                self.evictions += 1
+        return instance
+
+    def instantiate_plugin_classes(self, plugin_classes, *args, **kwargs):
+        """A generator function of the cached instances of plugin classes, as :func:`instantiate_plugin_classes`."""
+        for plugin_class in plugin_classes:
+            yield self.get(plugin_class, *args, **kwargs)
+
+    def clear(self):
+        """Forget every cached instance; the counters are left alone."""
+        with self._lock:
+            self._instances.clear()
+
+
+class PluginInstancePool(object):
+    """A pool of plugin instances that are checked out for exclusive use and returned afterwards.
+
+    An instance is only ever used by one caller at a time, which suits
+    plugins that are not thread safe.  Up to `max_idle` returned instances
+    are kept for each plugin class and constructor arguments; instances
+    returned beyond that are dropped and counted as evictions.
+
+    ::
+
+        from livetribe.plugins import PluginInstancePool
+
+        pool = PluginInstancePool()
+        with pool.instance(Parser, 'utf-8') as parser:
+            parser.parse(data)
+
+    :ivar max_idle: the most idle instances kept for each plugin class and arguments
+    :ivar hits: the number of checkouts that reused an idle instance
+    :ivar misses: the number of checkouts that constructed an instance
+    :ivar evictions: the number of returned instances that were dropped
+    """
+
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._idle = {}
+        self._checked_out = {}
+        self._lock = threading.Lock()
+
+    def checkout(self, plugin_class, *args, **kwargs):
+        """Return an instance of a plugin class for the arguments for exclusive use.
+
+        The instance must be given back with :meth:`checkin`.
+        """
+        key = _instance_key(plugin_class, args, kwargs)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                instance = idle.pop()
+                self.hits += 1
+            else:
+                instance = _missing
+                self.misses += 1
+        if instance is _missing:
+            instance = _construct_plugin(plugin_class, args, kwargs)
+
+        with self._lock:
+            self._checked_out[id(instance)] = (key, instance)
+        return instance
+
+    def checkin(self, instance):
+        """Give back an instance that was checked out.
+
+        :raises ValueError: if the instance is not checked out from this pool
+        """
+        with self._lock:
+            key, checked_out = self._checked_out.get(id(instance), (None, None))
+            if checked_out is not instance:
+                raise ValueError('%r is not checked out from this pool' % (instance, ))
+            del self._checked_out[id(instance)]
+            # instances constructed with unhashable arguments cannot be matched to a later checkout
+            idle = self._idle.setdefault(key, []) if key is not None else None
+            if idle is not None and len(idle) < self.max_idle:
+                idle.append(instance)
+            else:
+                self.evictions += 1
 
+    @contextmanager
+    def instance(self, plugin_class, *args, **kwargs):
+        """A context manager that checks out an instance and returns it to the pool on exit."""
+        instance = self.checkout(plugin_class, *args, **kwargs)
+        try:
+            yield instance
+        finally:
+            self.checkin(instance)
+
+    def clear(self):
+        """Drop every idle instance; checked out instances can still be returned."""
+        with self._lock:
+            self._idle.clear()
+
+
+_missing = object()
 
-def collect_plugin_classes(namespace, subclasses_of=None, recurse=False):
+
+def collect_plugin_classes(namespace, subclasses_of=None, recurse=False, index=None, static=False,
+                           workers=None, load_times=None, entry_point_group=None, defined_in_module=False,
+                           failures=None, failure_cache=None):
     """A generator function that searches namespaces for plugin classes.
 
     :param namespace: the root namespace to begin searching
@@ -66,31 +396,111 @@ def collect_plugin_classes(namespace, subclasses_of=None, recurse=False):
     :type subclasses_of: a single parent class or collection of classes, default None
     :param recurse: whether or not to recurse from the root namespace
     :type recurse: default False
+    :param index: a discovery index to consult instead of listing every directory
+    :type index: :class:`PluginIndex`, default None
+    :param static: whether to parse plugin sources first and only import modules
+        that define a class which could be a plugin class
+    :type static: default False
+    :param workers: the number of threads that read and compile plugin sources ahead of importing them
+    :type workers: default None, i.e. no threads
+    :param load_times: a dictionary to record the seconds taken to load each plugin module in
+    :type load_times: default None
+    :param entry_point_group: an entry point group of installed distributions whose
+        plugin classes are collected after those beneath the namespace
+    :type entry_point_group: default None
+    :param defined_in_module: whether to skip classes that a plugin module imports
+        from elsewhere rather than defines itself
+    :type defined_in_module: default False
+    :param failures: a list to append an :class:`ImportFailure` to for each plugin module that
+        failed to import, or was skipped because it failed before
+    :type failures: default None
+    :param failure_cache: a cache to remember the plugin modules that failed to import in,
+        e.g. :data:`import_failures`; they are skipped until their source changes or the failure expires
+    :type failure_cache: :class:`ImportFailureCache`, default None
     :rtype: plugin classes that have been found beneath the indicated namespace
 
+    Each class is yielded once, even if it is found in several modules, and
+    is only tested against `subclasses_of` the first time it is found.
+
+    In static mode a module is only imported if it defines a class, one of
+    whose bases has the same name as one of `subclasses_of`, or whose bases
+    cannot be resolved without importing the module.  Plugin classes that a
+    module merely imports from elsewhere are therefore not collected from it.
+    When an `index` is given the results of parsing each source file are
+    kept in the index, keyed by the file's hash.
     """
-    if subclasses_of is not None:
-        try:
-            subclasses_of = tuple([subclass for subclass in subclasses_of])
-        except TypeError:
-            subclasses_of = (subclasses_of, )
+    subclasses_of = _parent_classes(subclasses_of)
+
+    # every class found is tested once, however many modules import it
+    tested = {}
+    classes = _collect_plugin_module_classes(namespace, recurse=recurse, index=index,
+                                             subclasses_of=subclasses_of if static else False,
+                                             workers=workers, load_times=load_times,
+                                             defined_in_module=defined_in_module, failures=failures,
+                                             failure_cache=failure_cache)
+    for cls in _untested_plugin_classes(classes, subclasses_of, tested):
+        yield cls
 
-    for cls in _collect_plugin_named_attributes(namespace, recurse=recurse):
-        if isinstance(cls, type):
-            if subclasses_of is None:
+    if entry_point_group is not None:
+        for entry_point in collect_plugin_entry_points(entry_point_group, index=index):
+            try:
+                loaded = entry_point.load()
+            except (ImportError, AttributeError):
+                log.warning('Problems loading entry point %s', entry_point)
+                log.debug('', exc_info=1)
+                continue
+
+            candidates = _module_classes(loaded, defined_in_module) if isinstance(loaded, ModuleType) else [loaded]
+            for cls in _untested_plugin_classes(candidates, subclasses_of, tested):
                 yield cls
-            elif issubclass(cls, subclasses_of) and not cls in subclasses_of:
+
+
+def _is_plugin_class(cls, subclasses_of):
+    if isinstance(cls, type):
+        if subclasses_of is None:
+            return True
+        elif issubclass(cls, subclasses_of) and not cls in subclasses_of:
+            return True
+    return False
+
+
+def _untested_plugin_classes(classes, subclasses_of, tested):
+    """Yield the plugin classes among classes that are not in `tested`, recording the result of each test in it."""
+    for cls in classes:
+        if cls not in tested:
+            tested[cls] = is_plugin_class = _is_plugin_class(cls, subclasses_of)
+            if is_plugin_class:
                 yield cls
 
 
-def _collect_plugin_named_attributes(namespace, recurse=False):
-    for module in collect_plugin_modules(namespace, recurse=recurse):
-        for attr_name in dir(module):
-            if not attr_name.startswith('_'):
-                yield getattr(module, attr_name)
+def _collect_plugin_module_classes(namespace, recurse=False, index=None, subclasses_of=False,
+                                   workers=None, load_times=None, defined_in_module=False, failures=None,
+                                   failure_cache=None):
+    plugin_paths = _walk_plugin_paths(namespace, recurse, index=index)
+    if subclasses_of is not False:
+        plugin_paths = _static_class_candidates(plugin_paths, subclasses_of, index)
+
+    for module in _import_plugin_modules(plugin_paths, workers=workers, load_times=load_times, failures=failures,
+                                         failure_cache=failure_cache):
+        measurement = _listeners and _start_measurement()
+        classes = _module_classes(module, defined_in_module)
+        if measurement:
+            _notify(PHASE_ATTRIBUTES, module.__name__, *_stop_measurement(measurement))
 
+        for cls in classes:
+            yield cls
 
-def collect_plugin_modules(namespace, methods=None, recurse=False):
+
+def _module_classes(module, defined_in_module=False):
+    """Return the public classes in a module's namespace, optionally only those it defines."""
+    module_name = module.__name__
+    return [value for attr_name, value in list(vars(module).items())
+            if isinstance(value, type) and not attr_name.startswith('_')
+            and (not defined_in_module or value.__module__ == module_name)]
+
+
+def collect_plugin_modules(namespace, methods=None, recurse=False, index=None, workers=None, load_times=None,
+                           failures=None, name_pattern=None, static=False, limit=None, failure_cache=None):
     """A generator function that searches namespaces for plugin methods.
 
     :param namespace: the root namespace to begin searching
@@ -98,64 +508,2685 @@ def collect_plugin_modules(namespace, methods=None, recurse=False):
     :type methods: a single method name or collection of names, default None
     :param recurse: whether or not to recurse from the root namespace
     :type recurse: default False
+    :param index: a discovery index to consult instead of listing every directory
+    :type index: :class:`PluginIndex`, default None
+    :param workers: the number of threads that read and compile plugin sources ahead of importing them
+    :type workers: default None, i.e. no threads
+    :param load_times: a dictionary to record the seconds taken to load each plugin module in
+    :type load_times: default None
+    :param failures: a list to append an :class:`ImportFailure` to for each plugin module that
+        failed to import, or was skipped because it failed before
+    :type failures: default None
+    :param name_pattern: a shell style pattern, or compiled regular expression, that the
+        dotted names of plugin modules must match; it is applied before importing them
+    :type name_pattern: default None
+    :param static: whether to parse plugin sources first and only import modules that
+        could export one of `methods`
+    :type static: default False
+    :param limit: the most plugin modules to yield; the search stops once they are found
+    :type limit: default None, i.e. no limit
+    :param failure_cache: a cache to remember the plugin modules that failed to import in,
+        e.g. :data:`import_failures`; they are skipped until their source changes or the failure expires
+    :type failure_cache: :class:`ImportFailureCache`, default None
     :rtype: Python methods that have been found beneath the indicated namespace
 
+    With `workers`, the source and bytecode of every plugin found are read,
+    and compiled if the bytecode is stale, by a pool of threads while the
+    modules are imported one at a time, in the order they were found, under
+    the interpreter's import lock.  The load time recorded for a module
+    includes the time its worker took.
+
+    With a `failure_cache`, plugin modules that fail to import are
+    remembered in it and are not imported again until their source changes
+    or the failure expires.
     """
-    if methods:
-        try:
-            methods = set([method_name for method_name in methods])
-        except TypeError:
-            methods = set([methods])
+    methods = _method_names(methods)
+
+    if limit is not None and limit <= 0:
+        return
+
+    plugin_paths = _walk_plugin_paths(namespace, recurse, index=index)
+    if name_pattern is not None:
+        plugin_paths = _match_plugin_names(plugin_paths, name_pattern)
+    if static and methods:
+        plugin_paths = _static_method_candidates(plugin_paths, methods, index)
+
+    modules = _import_plugin_modules(plugin_paths, methods, workers, load_times, failures, failure_cache)
+    try:
+        for module in itertools.islice(modules, limit):
+            yield module
+    finally:
+        # a limit, or a caller that stops early, leaves the walk unfinished and its index unsaved
+        if index is not None:
+            index.save()
+
+
+def find_first_plugin_module(namespace, methods, recurse=False, index=None, name_pattern=None):
+    """Return the first plugin module beneath a namespace that exports one of the methods.
+
+    Plugin modules whose names do not match `name_pattern`, or whose
+    sources show that they cannot export any of `methods`, are not
+    imported, and the search stops at the first match.
+
+    :param namespace: the root namespace to begin searching
+    :param methods: the method name or names that are to be found
+    :type methods: a single method name or collection of names
+    :param recurse: whether or not to recurse from the root namespace
+    :type recurse: default False
+    :param index: a discovery index to consult, and to cache source scans in
+    :type index: :class:`PluginIndex`, default None
+    :param name_pattern: a shell style pattern, or compiled regular expression, that the
+        dotted names of plugin modules must match
+    :type name_pattern: default None
+    :rtype: the plugin module or ``None`` if there is none
+
+    ::
+
+        from livetribe.plugins import find_first_plugin_module
+
+        module = find_first_plugin_module('acme.handlers', ['handle_png'], name_pattern='*.image*')
+    """
+    if isinstance(methods, str):
+        methods = [methods]
+    for module in collect_plugin_modules(namespace, methods, recurse, index=index, name_pattern=name_pattern,
+                                         static=True, limit=1):
+        return module
+    return None
+
+
+def _match_plugin_names(plugin_paths, name_pattern):
+    if hasattr(name_pattern, 'search'):
+        matches = lambda name: name_pattern.search(name) is not None
+    else:
+        matches = lambda name: fnmatch.fnmatchcase(name, name_pattern)
+
+    for plugin_path, source_path in plugin_paths:
+        if matches(_import_path(plugin_path)):
+            yield plugin_path, source_path
+
+
+def _static_method_candidates(plugin_paths, methods, index=None):
+    """Filter plugin paths down to those whose source could export one of the methods."""
+    for plugin_path, source_path in plugin_paths:
+        scan = _plugin_source_scan(source_path, index)
+        if scan is None or scan['dynamic'] or not methods.isdisjoint(scan['names']):
+            yield plugin_path, source_path
+        else:
+            log.debug('Statically skipping %s', plugin_path)
+
+
+def collect_plugin_handles(namespace, recurse=False, index=None):
+    """A generator function that searches namespaces for plugins without importing them.
+
+    :param namespace: the root namespace to begin searching
+    :param recurse: whether or not to recurse from the root namespace
+    :type recurse: default False
+    :param index: a discovery index to consult instead of listing every directory
+    :type index: :class:`PluginIndex`, default None
+    :rtype: a :class:`PluginHandle` for each plugin found beneath the indicated namespace
+
+    ::
+
+        from livetribe.plugins import collect_plugin_handles
+
+        handles = dict((handle.name, handle) for handle in collect_plugin_handles('acme.plugins', recurse=True))
+        handles['acme.plugins.mock'].do(45)
+    """
+    for plugin_path, source_path in _walk_plugin_paths(namespace, recurse, index=index):
+        yield PluginHandle(_import_path(plugin_path), source_path, os.path.basename(source_path) == '__init__.py')
+
+
+class PluginHandle(object):
+    """A lightweight reference to a plugin module that is imported on first use.
+
+    Accessing an attribute that the handle itself does not define imports
+    the module and returns the module's attribute.
+
+    :ivar name: the dotted name of the plugin module
+    :ivar path: the file that holds the plugin's source
+    :ivar is_package: whether the plugin is a package
+    """
+
+    __slots__ = ('name', 'path', 'is_package', '_module')
+
+    def __init__(self, name, path, is_package=False):
+        self.name = name
+        self.path = path
+        self.is_package = is_package
+        self._module = None
+
+    @property
+    def loaded(self):
+        """Whether the plugin module has been imported through this handle."""
+        return self._module is not None
+
+    def load(self):
+        """Import the plugin module, if it has not already been imported, and return it.
+
+        :raises ImportError: if the plugin module cannot be imported
+        """
+        if self._module is None:
+            log.debug('Importing %s', self.name)
+            self._module = _import_plugin(self.name, self)
+        return self._module
+
+    def _forget_plugin_modules(self, names):
+        if self._module is not None and self.name in names:
+            self._module = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        return '<PluginHandle %s%s>' % (self.name, ' (loaded)' if self._module is not None else '')
 
-    for filepath in _collect_plugin_paths(namespace, recurse):
-        path_segments = list(filepath.split(os.path.sep))
-        path_segments = [p for p in path_segments if p]
-        path_segments[-1] = os.path.splitext(path_segments[-1])[0]
-        import_path = '.'.join(path_segments)
 
+def collect_plugin_records(namespace, recurse=False, index=None):
+    """A generator function that searches namespaces for plugins, describing each with a compact record.
+
+    Records hold no reference to the plugin module and share their
+    namespace and directory strings with their siblings, so a catalog of
+    every plugin in a large installation can be kept resident cheaply.
+
+    :param namespace: the root namespace to begin searching
+    :param recurse: whether or not to recurse from the root namespace
+    :type recurse: default False
+    :param index: a discovery index to consult instead of listing every directory
+    :type index: :class:`PluginIndex`, default None
+    :rtype: a :class:`PluginRecord` for each plugin found beneath the indicated namespace
+
+    ::
+
+        from livetribe.plugins import collect_plugin_records
+
+        catalog = dict((record.name, record) for record in collect_plugin_records('acme.plugins', recurse=True))
+        catalog['acme.plugins.mock'].load().do(45)
+    """
+    interned = {}
+    for plugin_path, source_path in _walk_plugin_paths(namespace, recurse, index=index):
+        plugin_namespace, _, file_name = plugin_path.rpartition(os.path.sep)
+        directory, source_name = os.path.split(source_path)
+        is_package = source_name == '__init__.py'
+        if is_package:
+            directory = os.path.dirname(directory)
+        yield PluginRecord(interned.setdefault(plugin_namespace, sys.intern(plugin_namespace)),
+                           sys.intern(os.path.splitext(file_name)[0]),
+                           interned.setdefault(directory, directory),
+                           is_package)
+
+
+class PluginRecord(object):
+    """A compact description of a discovered plugin module.
+
+    Only the plugin's namespace, its own name and the directory it was
+    found in are stored; its dotted name and source path are derived from
+    them when asked for.
+
+    :ivar namespace: the dotted name of the namespace the plugin belongs to
+    :ivar module: the plugin's name within its namespace
+    :ivar directory: the directory that holds the plugin
+    :ivar is_package: whether the plugin is a package
+    """
+
+    __slots__ = ('namespace', 'module', 'directory', 'is_package')
+
+    def __init__(self, namespace, module, directory, is_package=False):
+        self.namespace = namespace
+        self.module = module
+        self.directory = directory
+        self.is_package = is_package
+
+    @property
+    def name(self):
+        """The dotted name of the plugin module."""
+        return self.namespace + '.' + self.module
+
+    @property
+    def path(self):
+        """The file that holds the plugin's source."""
+        if self.is_package:
+            return os.path.join(self.directory, self.module, '__init__.py')
+        return os.path.join(self.directory, self.module + '.py')
+
+    def load(self):
+        """Import the plugin module and return it.
+
+        :raises ImportError: if the plugin module cannot be imported
+        """
+        return _import_plugin(self.name)
+
+    def handle(self):
+        """Return a :class:`PluginHandle` for the plugin."""
+        return PluginHandle(self.name, self.path, self.is_package)
+
+    def __eq__(self, other):
+        if not isinstance(other, PluginRecord):
+            return NotImplemented
+        return (self.namespace, self.module, self.directory, self.is_package) == \
+               (other.namespace, other.module, other.directory, other.is_package)
+
+    def __hash__(self):
+        return hash((self.namespace, self.module))
+
+    def __repr__(self):
+        return '<PluginRecord %s>' % self.name
+
+
+def _import_plugin(name, holder=None):
+    """Import a plugin module, telling the active :class:`PluginScope` objects about it and its holder."""
+    module = import_module(name)
+    for scope in _scopes:
+        scope._imported(name, holder)
+    return module
+
+
+def _hold_plugin_modules(holder):
+    """Tell the active :class:`PluginScope` objects about an object that holds plugin modules."""
+    for scope in _scopes:
+        scope._imported(None, holder)
+
+
+def _import_plugin_modules(plugin_paths, methods=None, workers=None, load_times=None, failures=None,
+                           failure_cache=None):
+    if failure_cache is not None:
+        plugin_paths = _skip_import_failures(plugin_paths, failure_cache, failures)
+    prefetch_times = {}
+    if workers:
+        plugin_paths = _prefetch_plugin_paths(plugin_paths, workers, prefetch_times)
+
+    for plugin_path, source_path in plugin_paths:
+        import_path = _import_path(plugin_path)
+
+        measurement = _start_measurement()
         try:
             log.debug('Importing %s', import_path)
-            module = import_module(import_path)
+            module = _import_plugin(import_path)
             if methods and all(getattr(module, method_name, None) is None for method_name in methods):
-                continue
+                module = None
         except ImportError as ie:
-            log.warn('Problems importing %s', import_path)
+            log.warning('Problems importing %s', import_path)
             log.debug('', exc_info=1)
             module = None
+            if failure_cache is not None:
+                failure = failure_cache.record(import_path, source_path, ie)
+            else:
+                failure = ImportFailure(import_path, source_path, _source_mtime(source_path), ie, time.time())
+            if failures is not None:
+                failures.append(failure)
+        finally:
+            seconds, memory = _stop_measurement(measurement)
+            seconds += prefetch_times.get(source_path, 0.0)
+            if load_times is not None:
+                load_times[import_path] = seconds
+            if _listeners:
+                _notify(PHASE_IMPORT, import_path, seconds, memory)
 
         if module is not None:
             yield module
 
 
-def _collect_plugin_paths(namespace, recurse=False, already_seen=None):
+def _skip_import_failures(plugin_paths, failure_cache, failures=None):
+    for plugin_path, source_path in plugin_paths:
+        failure = failure_cache.get(_import_path(plugin_path), source_path)
+        if failure is None:
+            yield plugin_path, source_path
+        else:
+            log.warning('Skipping %s, which failed to import: %r', failure.name, failure.error)
+            if failures is not None:
+                failures.append(failure)
+
+
+def _prefetch_plugin_paths(plugin_paths, workers, prefetch_times):
+    """Read and compile plugin sources on a pool of threads, yielding each plugin path once it is ready."""
+    plugin_paths = list(plugin_paths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_prefetch_plugin_code, _import_path(plugin_path), source_path)
+                   for plugin_path, source_path in plugin_paths]
+        for (plugin_path, source_path), future in zip(plugin_paths, futures):
+            prefetch_times[source_path] = future.result()
+            yield plugin_path, source_path
+
+
+def _prefetch_plugin_code(name, source_path):
+    """Read a plugin's source and bytecode, writing fresh bytecode if it is stale; return the seconds taken."""
+    start = time.perf_counter()
+    try:
+        SourceFileLoader(name, source_path).get_code(name)
+    except Exception:
+        log.debug('Unable to prefetch %s, it will be loaded when imported', name, exc_info=1)
+    return time.perf_counter() - start
+
+
+def _import_path(plugin_path):
+    # plugin paths are always a dotted namespace joined to a single file name
+    namespace, _, file_name = plugin_path.rpartition(os.path.sep)
+    if file_name.endswith('.py'):
+        file_name = file_name[:-3]
+    return namespace + '.' + file_name if namespace else file_name
+
+
+def _collect_plugin_paths(namespace, recurse=False, already_seen=None, index=None):
+    for plugin_path, _ in _walk_plugin_paths(namespace, recurse, already_seen, index):
+        yield plugin_path
+
+
+def _walk_plugin_paths(namespace, recurse=False, already_seen=None, index=None):
+    """Yield a ``(plugin_path, source_path)`` pair for each plugin beneath a namespace.
+
+    The plugin path is the namespace joined to the module or package file
+    name, e.g. ``acme.plugins/mock``, and the source path is the file that
+    holds the plugin's source, e.g. ``.../acme/plugins/mock/__init__.py``.
+    """
     log.debug('collecting plugin paths for %s%s', namespace, ', recursing modules' if recurse else '')
+    top_level = already_seen is None
     already_seen = set() if already_seen is None else already_seen
 
-    # Look in each location in the path
-    for sys_path in sys.path:
-        # Within this, we want to look for a package for the namespace
-        namespace_rel_path = namespace.replace(".", os.path.sep)
-        namespace_path = os.path.join(sys_path, namespace_rel_path)
-        if os.path.exists(namespace_path):
-            for candidate in os.listdir(namespace_path):
-                candidate_path = os.path.join(namespace_path, candidate)
-                if os.path.isdir(candidate_path):
-                    if not _is_package(candidate_path):
-                        continue
-                    if recurse:
-                        subns = '.'.join((namespace, candidate.split('.py')[0]))
-                        for path in _collect_plugin_paths(subns, recurse, already_seen):
-                            yield path
-                else:
-                    base, ext = os.path.splitext(candidate)
-                    if base == '__init__' or ext != '.py':
-                        continue
+    try:
+        for namespace_path in _namespace_roots(namespace):
+            for paths in _measured_walk(namespace_path, _walk_plugin_root(namespace, namespace_path, recurse,
+                                                                           already_seen, index)):
+                yield paths
+    finally:
+        if top_level and index is not None:
+            index.save()
+
+
+def _walk_plugin_root(namespace, namespace_path, recurse, already_seen, index):
+    listing = _list_plugin_directory(namespace_path, index)
+    if listing is not None:
+        for paths in _walk_plugin_directory(namespace, namespace_path, listing, recurse, already_seen, index):
+            yield paths
+
+
+def _measured_walk(namespace_path, walk):
+    """Pass along what a walk yields, notifying listeners of the time spent in the walk itself."""
+    if not _listeners:
+        for paths in walk:
+            yield paths
+        return
+
+    seconds, memory = 0.0, 0
+    while True:
+        measurement = _start_measurement()
+        try:
+            paths = next(walk)
+        except StopIteration:
+            paths = None
+        step_seconds, step_memory = _stop_measurement(measurement)
+        seconds += step_seconds
+        memory = None if step_memory is None or memory is None else memory + step_memory
+        if paths is None:
+            _notify(PHASE_SCAN, namespace_path, seconds, memory)
+            return
+        yield paths
+
+
+def _namespace_roots(namespace):
+    """Return the directories that may hold the plugins of a namespace.
+
+    If the namespace has already been imported as a package its ``__path__``
+    is used, otherwise the namespace is looked for in each location in
+    ``sys.path``.
+    """
+    path = getattr(sys.modules.get(namespace), '__path__', None)
+    if path is not None:
+        return list(path)
+
+    namespace_rel_path = namespace.replace(".", os.path.sep)
+    return [os.path.join(sys_path, namespace_rel_path) for sys_path in sys.path]
+
+
+def _walk_plugin_directory(namespace, namespace_path, listing, recurse, already_seen, index):
+    for candidate, is_dir in listing['entries']:
+        candidate_path = os.path.join(namespace_path, candidate)
+        if is_dir:
+            # only directories named like modules can be plugin packages, so others are never listed
+            if candidate == '__pycache__' or not candidate.isidentifier():
+                continue
+            if recurse:
+                # the listing is needed to recurse anyway and tells whether it is a package
+                candidate_listing = _list_plugin_directory(candidate_path, index)
+                if candidate_listing is None or not candidate_listing['package']:
+                    continue
+                subns = '.'.join((namespace, candidate.split('.py')[0]))
+                for paths in _walk_plugin_directory(subns, candidate_path, candidate_listing,
+                                                    recurse, already_seen, index):
+                    yield paths
+            elif not _is_package(candidate_path, index):
+                continue
+            candidate_path = os.path.join(candidate_path, '__init__.py')
 
-                candidate_namespace = os.path.join(namespace, candidate)
-                if candidate_namespace not in already_seen:
-                    already_seen.add(candidate_namespace)
-                    yield candidate_namespace
+        candidate_namespace = os.path.join(namespace, candidate)
+        if candidate_namespace not in already_seen:
+            already_seen.add(candidate_namespace)
+            yield candidate_namespace, candidate_path
 
 
-def _is_package(path):
+def _list_plugin_directory(path, index=None):
+    """Return the plugin candidates of a directory, or ``None`` if it does not exist.
+
+    The listing is a dictionary whose ``entries`` are ``(name, is_dir)`` pairs,
+    in directory order, for every sub-directory and every ``.py`` module other
+    than ``__init__.py``; ``package`` records whether ``__init__.py`` is present.
+    """
+    if index is not None:
+        return index.listing(path)
+
+    try:
+        return _scan_plugin_directory(path)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        return _list_plugin_container(path)
+
+
+def _scan_plugin_directory(path):
+    """List a directory with a single ``scandir``, using the entries' types rather than stat calls."""
+    entries = []
+    package = False
+    with os.scandir(path) as dir_entries:
+        for entry in dir_entries:
+            candidate = entry.name
+            if entry.is_dir():
+                entries.append((candidate, True))
+            else:
+                base, ext = os.path.splitext(candidate)
+                if ext != '.py':
+                    continue
+                if base == '__init__':
+                    package = True
+                    continue
+                entries.append((candidate, False))
+
+    return {'entries': entries, 'package': package}
+
+
+def _list_plugin_container(path):
+    """List a path that is not a directory on the file system through the import system.
+
+    Paths within zip archives, e.g. zipapps, zipped eggs and wheels, are
+    listed from the archive's central directory, which is read once per
+    archive.  Any other path is listed with the finder that the import
+    system's path hooks provide for it, if there is one.
+    """
+    archive, inner_path = _split_archive_path(path)
+    if archive is not None:
+        listings = _archive_listings(archive)
+        return None if listings is None else listings.get(inner_path)
+
+    try:
+        importer = pkgutil.get_importer(path)
+    except Exception:
+        importer = None
+    if importer is None:
+        return None
+
+    entries = []
+    for _, name, is_package in pkgutil.iter_modules([path]):
+        entries.append((name, True) if is_package else (name + '.py', False))
+    # finders only report directories that are packages
+    return {'entries': entries, 'package': True}
+
+
+def _split_archive_path(path):
+    """Split a path into the zip archive that contains it and the path within the archive."""
+    for archive in list(_archives):
+        if path.startswith(archive + os.path.sep):
+            return archive, path[len(archive) + 1:].replace(os.path.sep, '/')
+
+    archive, inner_path = path, ''
+    while archive and not os.path.isfile(archive):
+        archive, tail = os.path.split(archive)
+        if not tail:
+            return None, None
+        inner_path = tail + ('/' + inner_path if inner_path else '')
+
+    if not archive or not zipfile.is_zipfile(archive):
+        return None, None
+    return archive, inner_path
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def _archive_listings(archive):
+    """Return the plugin listings of every directory in a zip archive, keyed by path within it.
+
+    The archive's central directory is read once and the listings are
+    cached until the archive's modification time or size changes.
+    """
+    try:
+        st = os.stat(archive)
+    except OSError:
+        _archives.pop(archive, None)
+        return None
+
+    signature = (st.st_mtime, st.st_size)
+    cached = _archives.get(archive)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _archives_lock:
+        cached = _archives.get(archive)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        log.debug('Listing plugin archive %s', archive)
+        listings = {}
+        seen = set()
+        with zipfile.ZipFile(archive) as zf:
+            for name in zf.namelist():
+                segments = [segment for segment in name.split('/') if segment]
+                is_file = not name.endswith('/')
+                for i in range(len(segments)):
+                    parent = '/'.join(segments[:i])
+                    listing = listings.setdefault(parent, {'entries': [], 'package': False})
+                    candidate = segments[i]
+                    if is_file and i == len(segments) - 1:
+                        base, ext = os.path.splitext(candidate)
+                        if ext != '.py':
+                            continue
+                        if base == '__init__':
+                            listing['package'] = True
+                            continue
+                        entry = (candidate, False)
+                    else:
+                        entry = (candidate, True)
+                    if (parent, entry) not in seen:
+                        seen.add((parent, entry))
+                        listing['entries'].append(entry)
+                        if entry[1]:
+                            listings.setdefault('/'.join(segments[:i + 1]), {'entries': [], 'package': False})
+
+        _archives[archive] = (signature, listings)
+        return listings
+
+
+def _read_plugin_source(source_path):
+    """Read a plugin's source, from a zip archive if it is within one."""
+    try:
+        with open(source_path, 'rb') as f:
+            return f.read()
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOTDIR:
+            raise
+        archive, inner_path = _split_archive_path(source_path)
+        if archive is None:
+            raise
+
+    with zipfile.ZipFile(archive) as zf:
+        return zf.read(inner_path)
+
+
+def _is_package(path, index=None):
+    if index is not None:
+        listing = index.listing(path)
+        return listing is not None and listing['package']
+
     return os.path.exists(os.path.join(path, '__init__.py'))
+
+
+class PluginIndex(object):
+    """A persistent discovery index of plugin directory listings.
+
+    Each directory visited during discovery is recorded along with its
+    modification time.  Later walks only ``stat`` a directory and reuse its
+    recorded listing; directories whose modification time has changed are
+    listed again and their entries replaced.  When a ``filename`` is given the
+    index is loaded from, and saved back to, that file.
+
+    ::
+
+        from livetribe.plugins import PluginIndex, collect_plugin_classes
+
+        index = PluginIndex('/var/cache/acme/plugins.idx')
+        for plugin in collect_plugin_classes('acme.plugins', recurse=True, index=index):
+            plugin().work()
+
+    The index for a deployment image can be built ahead of time with
+    :func:`build_plugin_index`.
+    """
+
+    VERSION = 5
+
+    def __init__(self, filename=None, load=True):
+        self.filename = filename
+        self._directories = {}
+        self._sources = {}
+        self._entry_points = {}
+        self._dirty = filename is not None and not load
+
+        if filename is not None and load:
+            self.load()
+
+    def __len__(self):
+        return len(self._directories)
+
+    def load(self):
+        """Load the index from its file, discarding it if it is missing or unreadable."""
+        self._directories = {}
+        self._sources = {}
+        self._entry_points = {}
+        self._dirty = False
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            log.debug('Unable to load plugin index %s', self.filename, exc_info=1)
+            return
+
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            log.debug('Ignoring plugin index %s with an unknown version', self.filename)
+            return
+
+        try:
+            directories = {}
+            for path, (mtime, listing) in data.get('directories', {}).items():
+                listing['entries'] = [tuple(entry) for entry in listing['entries']]
+                directories[path] = (mtime, listing)
+            sources = dict(data.get('sources', {}))
+            entry_points = dict(data.get('entry_points', {}))
+        except (TypeError, ValueError, KeyError):
+            log.debug('Ignoring malformed plugin index %s', self.filename, exc_info=1)
+            return
+
+        self._directories = directories
+        self._sources = sources
+        self._entry_points = entry_points
+
+    def save(self):
+        """Atomically write the index to its file if it has changed since it was loaded."""
+        if self.filename is None or not self._dirty:
+            return
+
+        data = {
+            'version': self.VERSION,
+            'directories': dict((path, [mtime, listing]) for path, (mtime, listing) in self._directories.items()),
+            'sources': self._sources,
+            'entry_points': self._entry_points,
+        }
+        try:
+            _write_json(self.filename, data)
+        except (IOError, OSError):
+            log.warning('Unable to save plugin index %s', self.filename)
+            log.debug('', exc_info=1)
+            return
+
+        self._dirty = False
+
+    def clear(self):
+        """Forget every recorded directory, source scan and entry point group."""
+        self._directories = {}
+        self._sources = {}
+        self._entry_points = {}
+        self._dirty = True
+
+    def listing(self, path):
+        """Return the plugin candidates of a directory, listing it only if it has changed.
+
+        :param path: the directory
+        :rtype: the directory listing or ``None`` if the directory does not exist
+        """
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(key)
+        except OSError as e:
+            if e.errno == errno.ENOTDIR:
+                # within an archive, which keeps its own cached listing
+                return _list_plugin_container(path)
+            st = None
+
+        if st is None or not stat.S_ISDIR(st.st_mode):
+            if self._directories.pop(key, None) is not None:
+                self._dirty = True
+            return None
+
+        mtime = st.st_mtime
+        recorded = self._directories.get(key)
+        if recorded is not None and recorded[0] == mtime:
+            return recorded[1]
+
+        log.debug('Indexing plugin directory %s', key)
+        listing = _scan_plugin_directory(key)
+        if recorded is not None:
+            self._forget_removed_directories(key, recorded[1], listing)
+            self._forget_removed_sources(key, listing)
+        self._directories[key] = (mtime, listing)
+        self._dirty = True
+        return listing
+
+    def source_scan(self, source, path):
+        """Return the static scan of a plugin's source, parsing it only if it has changed.
+
+        One scan is kept for each source file, along with a hash of the
+        source it was made from, so editing a plugin replaces its scan.
+
+        :param source: the plugin's source as bytes
+        :param path: the file that holds the source
+        :rtype: the scan, see :func:`_scan_plugin_source`
+        """
+        key = os.path.abspath(path)
+        digest = hashlib.sha1(source).hexdigest()
+        recorded = self._sources.get(key)
+        if recorded is not None and recorded[0] == digest:
+            return recorded[1]
+
+        scan = _scan_plugin_source(source)
+        self._sources[key] = [digest, scan]
+        self._dirty = True
+        return scan
+
+    def entry_points(self, group):
+        """Return the entry points of a group, reading distribution metadata only if the environment has changed.
+
+        The environment is identified by ``sys.path`` and the modification
+        time of each of its directories, which changes when a distribution
+        is installed into or removed from it.
+
+        :param group: the entry point group
+        :rtype: a list of ``[name, value, distribution]`` lists
+        """
+        signature = _environment_signature()
+        recorded = self._entry_points.get(group)
+        if recorded is not None and recorded[0] == signature:
+            return recorded[1]
+
+        entries = _read_entry_points(group)
+        self._entry_points[group] = [signature, entries]
+        self._dirty = True
+        return entries
+
+    def _forget_removed_directories(self, path, old_listing, new_listing):
+        remaining = set(name for name, is_dir in new_listing['entries'] if is_dir)
+        for name, is_dir in old_listing['entries']:
+            if not is_dir or name in remaining:
+                continue
+            removed = os.path.join(path, name)
+            for recorded_path in list(self._directories):
+                if recorded_path == removed or recorded_path.startswith(removed + os.path.sep):
+                    del self._directories[recorded_path]
+
+    def _forget_removed_sources(self, path, listing):
+        present = set(name for name, _ in listing['entries'])
+        if listing['package']:
+            present.add('__init__.py')
+        prefix = path + os.path.sep
+        for source_path in list(self._sources):
+            if source_path.startswith(prefix) and source_path[len(prefix):].split(os.path.sep)[0] not in present:
+                del self._sources[source_path]
+
+    def refresh(self, namespaces, recurse=False):
+        """Walk namespaces, re-listing every changed directory, and save the index.
+
+        :param namespaces: the root namespace or namespaces to walk
+        :type namespaces: a single namespace or collection of namespaces
+        :param recurse: whether or not to recurse from the root namespaces
+        :type recurse: default False
+        """
+        if isinstance(namespaces, str):
+            namespaces = [namespaces]
+
+        for namespace in namespaces:
+            for _ in _collect_plugin_paths(namespace, recurse, index=self):
+                pass
+
+        self.save()
+
+
+def _write_json(filename, data):
+    """Atomically replace a file with data encoded as JSON."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix='.plugins-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, filename)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build_plugin_index(filename, namespaces, recurse=False):
+    """Build a fresh discovery index for namespaces and save it to a file.
+
+    This is intended to be run when building a deployment image so that
+    processes started from it do not have to list any plugin directory.
+
+    :param filename: the file to write the index to
+    :param namespaces: the root namespace or namespaces to index
+    :type namespaces: a single namespace or collection of namespaces
+    :param recurse: whether or not to recurse from the root namespaces
+    :type recurse: default False
+    :rtype: the :class:`PluginIndex` that was built
+    """
+    index = PluginIndex(filename, load=False)
+    index.refresh(namespaces, recurse)
+    return index
+
+
+def _plugin_source_scan(source_path, index=None):
+    """Return the static scan of a plugin's source, or ``None`` if the source cannot be read.
+
+    When an `index` is given the scan is kept in, and reused from, the index.
+    """
+    try:
+        source = _read_plugin_source(source_path)
+        return index.source_scan(source, source_path) if index is not None else _scan_plugin_source(source)
+    except (IOError, OSError):
+        log.debug('Unable to read %s, it is not scanned', source_path, exc_info=1)
+        return None
+
+
+def _static_class_candidates(plugin_paths, subclasses_of, index=None):
+    """Filter plugin paths down to those whose source could define a plugin class."""
+    for plugin_path, source_path in plugin_paths:
+        scan = _plugin_source_scan(source_path, index)
+        if scan is None or _may_define_subclass(scan, _import_path(plugin_path), subclasses_of,
+                                                os.path.basename(source_path) == '__init__.py'):
+            yield plugin_path, source_path
+        else:
+            log.debug('Statically skipping %s', plugin_path)
+
+
+def _scan_plugin_source(source):
+    """Parse a plugin's source and record its classes and imported names.
+
+    The scan is a JSON friendly dictionary: ``classes`` is a list of
+    ``[class_name, bases]`` pairs where each base is the dotted name of the
+    base expression or ``None`` if it is not a plain name; ``imports`` maps
+    each imported name to the dotted name it was imported from, with leading
+    dots for relative imports; ``metadata`` maps each module level
+    ``__plugin_*__`` name that is assigned a literal to its value.  Classes
+    and imports within ``if``, ``try``, ``with`` and loop statements at
+    module level are recorded too, since they may be defined when the module
+    is imported.  ``names``
+    lists the names bound at module level and ``dynamic`` records whether
+    the module may bind names that cannot be seen, e.g. through a star
+    import or a module ``__getattr__``.  ``None`` is returned if the source
+    cannot be parsed.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    classes = []
+    imports = {}
+    metadata = {}
+    for node in _module_level_statements(tree):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id.startswith('__plugin_') and target.id.endswith('__'):
+                    try:
+                        metadata[target.id] = ast.literal_eval(node.value)
+                    except ValueError:
+                        pass
+        elif isinstance(node, ast.ClassDef):
+            classes.append([node.name, [_dotted_name(base) for base in node.bases]])
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = alias.name
+                else:
+                    top_level = alias.name.split('.')[0]
+                    imports[top_level] = top_level
+        elif isinstance(node, ast.ImportFrom):
+            module = '.' * (node.level or 0) + (node.module or '')
+            for alias in node.names:
+                if alias.name == '*':
+                    continue
+                separator = '' if module.endswith('.') else '.'
+                imports[alias.asname or alias.name] = module + separator + alias.name
+
+    names, dynamic = _module_level_names(tree)
+    return {'classes': classes, 'imports': imports, 'metadata': metadata, 'names': names, 'dynamic': dynamic}
+
+
+def _module_level_statements(tree):
+    """Yield the statements run at module level, in source order, including those nested in compound statements.
+
+    The bodies of functions and classes are not entered.
+    """
+    statements = list(reversed(tree.body))
+    while statements:
+        node = statements.pop()
+        yield node
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        nested = list(getattr(node, 'body', None) or [])
+        for handler in getattr(node, 'handlers', None) or []:
+            nested.extend(handler.body)
+        nested.extend(getattr(node, 'orelse', None) or [])
+        nested.extend(getattr(node, 'finalbody', None) or [])
+        statements.extend(reversed(nested))
+
+
+def _module_level_names(tree):
+    names = set()
+    dynamic = False
+    for node in _module_level_statements(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            dynamic = dynamic or node.name == '__getattr__'
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == '*':
+                    dynamic = True
+                else:
+                    names.add(alias.asname or alias.name.split('.')[0])
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.For, ast.AsyncFor,
+                               ast.With, ast.AsyncWith)):
+            targets = getattr(node, 'targets', None) or [getattr(node, 'target', None)]
+            targets += [item.optional_vars for item in getattr(node, 'items', ())]
+            for target in filter(None, targets):
+                names.update(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            # e.g. globals().update(...) or setattr(sys.modules[__name__], ...)
+            dynamic = True
+
+    return sorted(names), dynamic
+
+
+def _dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _dotted_name(node.value)
+        if value is not None:
+            return value + '.' + node.attr
+    return None
+
+
+def _may_define_subclass(scan, module_name, subclasses_of, is_package):
+    """Return whether a scanned module could define a subclass of one of the classes."""
+    if not scan['classes']:
+        return False
+    if subclasses_of is None:
+        return True
+
+    class_bases = dict((name, bases) for name, bases in scan['classes'])
+    imports = scan['imports']
+    target_names = set(cls.__name__ for cls in subclasses_of)
+    package = module_name if is_package else module_name.rpartition('.')[0]
+    decided = {}
+
+    def may_match(class_name):
+        if class_name not in decided:
+            decided[class_name] = False
+            decided[class_name] = any(base_may_match(base) for base in class_bases[class_name])
+        return decided[class_name]
+
+    def base_may_match(base):
+        if base is None:
+            return True
+        if base.rpartition('.')[2] in target_names:
+            return True
+        if base in class_bases:
+            return may_match(base)
+
+        head, _, rest = base.partition('.')
+        if head in imports:
+            dotted = _resolve_relative_name(imports[head], package)
+            resolved = _resolve_loaded_name('.'.join(filter(None, (dotted, rest))))
+            if resolved is None:
+                return True
+            return isinstance(resolved, type) and issubclass(resolved, subclasses_of)
+
+        resolved = getattr(builtins, base, None)
+        if isinstance(resolved, type):
+            return issubclass(resolved, subclasses_of)
+        return True
+
+    return any(may_match(class_name) for class_name in class_bases)
+
+
+def _resolve_relative_name(name, package):
+    if not name.startswith('.'):
+        return name
+    level = len(name) - len(name.lstrip('.'))
+    parts = package.split('.')
+    if level > 1:
+        parts = parts[:-(level - 1)]
+    return '.'.join(parts + [name[level:]])
+
+
+def _resolve_loaded_name(dotted):
+    """Resolve a dotted name against modules that are already imported, without importing any."""
+    parts = dotted.split('.')
+    for i in range(len(parts) - 1, 0, -1):
+        module = sys.modules.get('.'.join(parts[:i]))
+        if module is None:
+            continue
+        obj = module
+        for attr in parts[i:]:
+            obj = getattr(obj, attr, None)
+            if obj is None:
+                return None
+        return obj
+    return None
+
+
+class PluginWatcher(object):
+    """A registry of the plugin modules beneath a namespace that picks up changes on each scan.
+
+    Each call to :meth:`scan` walks the namespace, re-listing only the
+    directories whose modification times have changed, and compares every
+    plugin's source file with the snapshot taken by the previous scan.
+    Plugins that have been added are imported, plugins whose source has
+    changed are reloaded and plugins that have been removed are dropped from
+    the registry and from ``sys.modules``; plugins that have not changed are
+    left alone.
+
+    ::
+
+        from livetribe.plugins import PluginWatcher
+
+        watcher = PluginWatcher('acme.plugins', recurse=True)
+        while True:
+            changes = watcher.scan()
+            for name in changes.added + changes.changed:
+                watcher.modules[name].do(45)
+            time.sleep(10)
+
+    :ivar modules: a dictionary of the plugin modules that are loaded, by dotted name
+    """
+
+    def __init__(self, namespace, recurse=False, index=None):
+        self.namespace = namespace
+        self.recurse = recurse
+        self.modules = {}
+        self._index = index if index is not None else PluginIndex()
+        self._snapshot = {}
+
+    def scan(self):
+        """Rescan the namespace, loading the plugins that were added or changed.
+
+        :rtype: the :class:`PluginChanges` since the previous scan
+        """
+        snapshot = {}
+        added, changed, failed = [], [], []
+        for plugin_path, source_path in _walk_plugin_paths(self.namespace, self.recurse, index=self._index):
+            name = _import_path(plugin_path)
+            signature = _source_signature(source_path)
+            if signature is None:
+                continue
+
+            snapshot[name] = signature
+            previous = self._snapshot.get(name)
+            if previous is None:
+                added.append(name)
+            elif previous != signature:
+                changed.append(name)
+
+        removed = [name for name in self._snapshot if name not in snapshot]
+        for name in removed:
+            self.modules.pop(name, None)
+            sys.modules.pop(name, None)
+
+        if added:
+            invalidate_caches()
+        for name in added + changed:
+            try:
+                module = self.modules.get(name)
+                if module is None:
+                    log.debug('Importing %s', name)
+                    self.modules[name] = _import_plugin(name, self)
+                else:
+                    log.debug('Reloading %s', name)
+                    self.modules[name] = reload(module)
+            except ImportError:
+                log.warning('Problems importing %s', name)
+                log.debug('', exc_info=1)
+                self.modules.pop(name, None)
+                failed.append(name)
+
+        self._snapshot = snapshot
+        return PluginChanges(added, changed, removed, failed)
+
+    def _forget_plugin_modules(self, names):
+        # forgetting the snapshot too makes the next scan import them again
+        for name in names:
+            if self.modules.pop(name, None) is not None:
+                self._snapshot.pop(name, None)
+
+
+def _source_signature(source_path):
+    try:
+        st = os.stat(source_path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_ino, st.st_size
+
+
+class PluginChanges(object):
+    """The plugins that were added, changed or removed between two scans.
+
+    Each attribute is a list of dotted module names; ``failed`` lists the
+    added or changed plugins that could not be imported.
+    """
+
+    __slots__ = ('added', 'changed', 'removed', 'failed')
+
+    def __init__(self, added, changed, removed, failed):
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.failed = failed
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return '<PluginChanges added=%r changed=%r removed=%r failed=%r>' % (self.added, self.changed,
+                                                                               self.removed, self.failed)
+
+
+class PluginRegistry(object):
+    """An index of the plugins beneath one or more namespaces with constant time lookups.
+
+    Discovery is performed when the registry is created, or refreshed, and
+    the plugins found are indexed by dotted module name, by every base class
+    in the method resolution order of each plugin class and by the name of
+    every callable each plugin module exports.  A refresh builds new indexes
+    and publishes them with a single assignment, so concurrent readers never
+    see a partially built registry.
+
+    ::
+
+        from livetribe.plugins import PluginRegistry
+        from acme.framework import Factory
+
+        registry = PluginRegistry('acme.plugins', recurse=True)
+        for plugin in registry.subclasses_of(Factory):
+            plugin(2).work()
+        for module in registry.providers_of('do'):
+            module.do(45)
+    """
+
+    def __init__(self, namespaces, recurse=False, index=None):
+        if isinstance(namespaces, str):
+            namespaces = [namespaces]
+        self.namespaces = tuple(namespaces)
+        self.recurse = recurse
+        self.index = index
+        self._indexes = ({}, {}, {})
+        self.refresh()
+
+    def refresh(self):
+        """Rediscover the plugins and replace the indexes."""
+        modules = {}
+        subclasses = {}
+        providers = {}
+        seen_classes = set()
+        for namespace in self.namespaces:
+            for module in collect_plugin_modules(namespace, recurse=self.recurse, index=self.index):
+                if module.__name__ in modules:
+                    continue
+                modules[module.__name__] = module
+
+                for attr_name, value in list(vars(module).items()):
+                    if attr_name.startswith('_') or not callable(value):
+                        continue
+                    providers.setdefault(attr_name, []).append(module)
+
+                    if isinstance(value, type) and value not in seen_classes:
+                        seen_classes.add(value)
+                        for base in value.__mro__[1:]:
+                            if base is not object:
+                                subclasses.setdefault(base, []).append(value)
+
+        self._indexes = (modules,
+                         dict((base, tuple(classes)) for base, classes in subclasses.items()),
+                         dict((name, tuple(provided)) for name, provided in providers.items()))
+        _hold_plugin_modules(self)
+
+    def _forget_plugin_modules(self, names):
+        modules, subclasses, providers = self._indexes
+        if names.isdisjoint(modules):
+            return
+        self._indexes = (dict((name, module) for name, module in modules.items() if name not in names),
+                         dict((base, tuple(cls for cls in classes if cls.__module__ not in names))
+                              for base, classes in subclasses.items() if base.__module__ not in names),
+                         dict((name, tuple(module for module in provided if module.__name__ not in names))
+                              for name, provided in providers.items()))
+
+    def __len__(self):
+        return len(self._indexes[0])
+
+    def __contains__(self, name):
+        return name in self._indexes[0]
+
+    def __iter__(self):
+        return iter(list(self._indexes[0].values()))
+
+    def module(self, name):
+        """Return the plugin module with a dotted name.
+
+        :raises KeyError: if there is no such plugin module
+        """
+        return self._indexes[0][name]
+
+    def subclasses_of(self, cls):
+        """Return the plugin classes that are subclasses of a class, excluding the class itself.
+
+        :rtype: a tuple of classes in discovery order
+        """
+        return self._indexes[1].get(cls, ())
+
+    def providers_of(self, name):
+        """Return the plugin modules that export a callable with a name.
+
+        :rtype: a tuple of modules in discovery order
+        """
+        return self._indexes[2].get(name, ())
+
+
+_scopes = []
+_scopes_lock = threading.Lock()
+
+
+class PluginScope(object):
+    """A context manager that unloads the plugin modules imported within it.
+
+    Every plugin module that this library imports while the scope is
+    active, along with any sub-modules imported beneath it, is removed
+    from ``sys.modules`` and from its parent package when the scope exits,
+    and the :class:`PluginHandle`, :class:`PluginRegistry` and
+    :class:`PluginWatcher` objects that loaded them within the scope drop
+    their references too.  Modules that were imported before the scope was
+    entered are never unloaded.
+
+    :param prefixes: the dotted names of further modules, e.g. helper
+        libraries the plugins use, to unload if they were imported within the scope
+    :type prefixes: default None
+    :param unload: whether to unload the modules when the scope exits
+    :type unload: default True
+    :ivar report: the :class:`PluginUnload` report once the modules have been unloaded
+
+    The memory freed is only measured while :mod:`tracemalloc` is tracing.
+    A warning is logged for every unloaded module that something else, e.g.
+    an instance of one of its classes, still keeps alive.  Imports made by
+    other threads while the scope is active are tracked too.
+
+    ::
+
+        from livetribe.plugins import PluginScope, collect_plugin_modules
+
+        with PluginScope() as scope:
+            names = [module.__name__ for module in collect_plugin_modules('acme.plugins', recurse=True)]
+        print(scope.report.freed)
+    """
+
+    def __init__(self, prefixes=None, unload=True):
+        if isinstance(prefixes, str):
+            prefixes = [prefixes]
+        self.prefixes = tuple(prefixes or ())
+        self.unload_on_exit = unload
+        self.report = None
+        self._before = None
+        self._plugins = set()
+        self._holders = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        global _scopes
+        self._before = set(sys.modules)
+        with _scopes_lock:
+            _scopes = _scopes + [self]
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _scopes
+        with _scopes_lock:
+            _scopes = [scope for scope in _scopes if scope is not self]
+        if self.unload_on_exit:
+            self.unload()
+        return False
+
+    def _imported(self, name, holder):
+        with self._lock:
+            if name is not None:
+                self._plugins.add(name)
+            if holder is not None:
+                self._holders[id(holder)] = holder
+
+    @property
+    def modules(self):
+        """The dotted names of the modules that would be unloaded, in the order they were imported."""
+        if self._before is None:
+            return []
+        with self._lock:
+            prefixes = tuple(name + '.' for name in self._plugins) + tuple(p + '.' for p in self.prefixes)
+            roots = self._plugins.union(self.prefixes)
+        return [name for name in list(sys.modules)
+                if name not in self._before and (name in roots or name.startswith(prefixes))]
+
+    def unload(self):
+        """Unload the modules imported within the scope.
+
+        :rtype: a :class:`PluginUnload` report, which is also kept as :attr:`report`
+        """
+        names = self.modules
+        tracing = tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if tracing else None
+
+        references = []
+        for name in reversed(names):
+            module = sys.modules.pop(name, None)
+            if module is None:
+                continue
+            parent_name, _, attr_name = name.rpartition('.')
+            parent = sys.modules.get(parent_name)
+            if parent is not None and getattr(parent, attr_name, None) is module:
+                try:
+                    delattr(parent, attr_name)
+                except AttributeError:
+                    pass
+            references.append((name, _module_references(name, module)))
+        module = parent = None
+
+        with self._lock:
+            holders, self._holders = self._holders, {}
+            self._plugins = set()
+        unloaded = frozenset(names)
+        for holder in holders.values():
+            holder._forget_plugin_modules(unloaded)
+        holders = None
+
+        gc.collect()
+        freed = before - tracemalloc.get_traced_memory()[0] if tracing else None
+        alive = [name for name, refs in references if any(ref() is not None for ref in refs)]
+        for name in alive:
+            log.warning('Unloaded plugin module %s is still referenced elsewhere and cannot be reclaimed', name)
+
+        self.report = PluginUnload([name for name, _ in references if name not in alive], alive, freed)
+        log.debug('Unloaded %d modules, %d still alive', len(references), len(alive))
+        return self.report
+
+
+def _module_references(name, module):
+    """Return weak references to a module and to the classes and functions it defines.
+
+    Any of them that is still alive keeps the module's namespace alive.
+    """
+    references = [weakref.ref(module)]
+    for value in list(vars(module).values()):
+        if isinstance(value, (type, FunctionType)) and getattr(value, '__module__', None) == name:
+            references.append(weakref.ref(value))
+    return references
+
+
+class PluginUnload(object):
+    """What unloading the modules of a :class:`PluginScope` reclaimed.
+
+    :ivar unloaded: the dotted names of the modules that were reclaimed
+    :ivar alive: the dotted names of the modules that were unloaded but are still referenced elsewhere
+    :ivar freed: the bytes of memory freed, or ``None`` if :mod:`tracemalloc` was not tracing
+    """
+
+    __slots__ = ('unloaded', 'alive', 'freed')
+
+    def __init__(self, unloaded, alive, freed=None):
+        self.unloaded = unloaded
+        self.alive = alive
+        self.freed = freed
+
+    def __repr__(self):
+        return '<PluginUnload unloaded=%d alive=%r freed=%r>' % (len(self.unloaded), self.alive, self.freed)
+
+
+def collect_plugin_entry_points(group, index=None):
+    """A generator function that reads plugin declarations from installed distributions' entry points.
+
+    :param group: the entry point group, e.g. ``acme.plugins``
+    :param index: a discovery index in which the entry points read are cached
+    :type index: :class:`PluginIndex`, default None
+    :rtype: a :class:`PluginEntryPoint` for each entry point in the group
+
+    Nothing is imported until an entry point is loaded.  With an `index`
+    the distribution metadata is only read again when ``sys.path`` or one
+    of its directories has changed; the index is saved if it was updated.
+
+    ::
+
+        from livetribe.plugins import collect_plugin_entry_points
+
+        for entry_point in collect_plugin_entry_points('acme.plugins'):
+            entry_point.load()().work()
+    """
+    if index is not None:
+        entries = index.entry_points(group)
+        index.save()
+    else:
+        entries = _read_entry_points(group)
+
+    for name, value, distribution in entries:
+        yield PluginEntryPoint(name, value, group, distribution)
+
+
+def _read_entry_points(group):
+    if _entry_points is None:
+        log.warning('Unable to read entry points for %s, importlib_metadata is required before Python 3.8', group)
+        return []
+
+    log.debug('Reading entry points for %s', group)
+    eps = _entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=group)
+    else:
+        eps = eps.get(group, ())
+
+    entries = []
+    for ep in eps:
+        dist = getattr(ep, 'dist', None)
+        entries.append([ep.name, ep.value, getattr(dist, 'name', None)])
+    return entries
+
+
+def _environment_signature():
+    signature = []
+    for sys_path in sys.path:
+        try:
+            mtime = os.stat(sys_path or os.curdir).st_mtime
+        except OSError:
+            mtime = None
+        signature.append([sys_path, mtime])
+    return signature
+
+
+class PluginEntryPoint(object):
+    """A plugin declared as an entry point of an installed distribution.
+
+    :ivar name: the entry point's name
+    :ivar value: the object reference, e.g. ``acme.factories:Factory``
+    :ivar group: the entry point group
+    :ivar distribution: the name of the distribution declaring it, if known
+    """
+
+    __slots__ = ('name', 'value', 'group', 'distribution')
+
+    def __init__(self, name, value, group, distribution=None):
+        self.name = name
+        self.value = value
+        self.group = group
+        self.distribution = distribution
+
+    def load(self):
+        """Import the referenced module and return the referenced object.
+
+        :raises ImportError: if the module cannot be imported
+        :raises AttributeError: if the module has no such object
+        """
+        module_name, _, attrs = self.value.partition(':')
+        obj = _import_plugin(module_name.strip())
+        attrs = attrs.split('[')[0].strip()
+        for attr in filter(None, attrs.split('.')):
+            obj = getattr(obj, attr)
+        return obj
+
+    def __repr__(self):
+        return '<PluginEntryPoint %s = %s>' % (self.name, self.value)
+
+
+PHASE_SCAN = 'scan'
+PHASE_IMPORT = 'import'
+PHASE_ATTRIBUTES = 'attributes'
+PHASE_INSTANTIATE = 'instantiate'
+
+_listeners = []
+
+
+def add_plugin_listener(listener):
+    """Register a callable to be notified as each phase of plugin discovery completes.
+
+    The listener is called with the phase, the name of what the phase
+    worked on, the seconds it took and the change in memory allocated by
+    Python, which is ``None`` unless :mod:`tracemalloc` is tracing.  The
+    phases are:
+
+    - :data:`PHASE_SCAN`, the walk of one root directory of a namespace,
+      named by the directory
+    - :data:`PHASE_IMPORT`, the import of a plugin module, named by the module
+    - :data:`PHASE_ATTRIBUTES`, the collection of the classes in a plugin
+      module's namespace that plugin classes are chosen from, named by the module
+    - :data:`PHASE_INSTANTIATE`, the construction of a plugin instance, named
+      by the dotted name of its class
+
+    :param listener: a callable taking ``(phase, name, seconds, memory)``
+    """
+    global _listeners
+    _listeners = _listeners + [listener]
+
+
+def remove_plugin_listener(listener):
+    """Unregister a listener registered with :func:`add_plugin_listener`."""
+    global _listeners
+    _listeners = [registered for registered in _listeners if registered is not listener]
+
+
+def _notify(phase, name, seconds, memory):
+    for listener in _listeners:
+        try:
+            listener(phase, name, seconds, memory)
+        except Exception:
+            log.warning('Plugin listener %r failed', listener)
+            log.debug('', exc_info=1)
+
+
+def _start_measurement():
+    return time.perf_counter(), tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+
+def _stop_measurement(measurement):
+    start, memory = measurement
+    seconds = time.perf_counter() - start
+    if memory is not None and tracemalloc.is_tracing():
+        memory = tracemalloc.get_traced_memory()[0] - memory
+    else:
+        memory = None
+    return seconds, memory
+
+
+def _class_name(cls):
+    return '%s.%s' % (cls.__module__, getattr(cls, '__qualname__', cls.__name__))
+
+
+class PluginStats(object):
+    """A plugin listener that records every phase of discovery and reports the slowest.
+
+    ::
+
+        from livetribe.plugins import PluginStats, collect_plugin_classes, instantiate_plugin_classes
+
+        with PluginStats() as stats:
+            for instance in instantiate_plugin_classes(collect_plugin_classes('acme.plugins', recurse=True)):
+                instance.work()
+        print(stats.report())
+
+    :ivar events: a list of ``(phase, name, seconds, memory)`` tuples in the order they occurred
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, phase, name, seconds, memory):
+        with self._lock:
+            self.events.append((phase, name, seconds, memory))
+
+    def __enter__(self):
+        add_plugin_listener(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_plugin_listener(self)
+
+    def totals(self):
+        """Return a dictionary of the total seconds spent in each phase."""
+        totals = {}
+        for phase, _, seconds, _ in self.events:
+            totals[phase] = totals.get(phase, 0.0) + seconds
+        return totals
+
+    def slowest(self, limit=10):
+        """Return the slowest events, slowest first.
+
+        :param limit: the number of events to return
+        :type limit: default 10
+        """
+        return sorted(self.events, key=lambda event: event[2], reverse=True)[:limit]
+
+    def report(self, limit=10):
+        """Return a text report of the time spent in each phase and the slowest plugins.
+
+        :param limit: the number of slowest plugins to list
+        :type limit: default 10
+        """
+        lines = ['%-12s %10s' % ('phase', 'seconds')]
+        for phase, seconds in sorted(self.totals().items(), key=lambda total: total[1], reverse=True):
+            lines.append('%-12s %10.4f' % (phase, seconds))
+
+        lines.append('')
+        lines.append('%-12s %10s %12s  %s' % ('phase', 'seconds', 'memory', 'name'))
+        for phase, name, seconds, memory in self.slowest(limit):
+            lines.append('%-12s %10.4f %12s  %s' % (phase, seconds, '-' if memory is None else memory, name))
+        return '\n'.join(lines)
+
+
+class ImportFailure(object):
+    """A plugin module that failed to import.
+
+    :ivar name: the dotted name of the plugin module
+    :ivar path: the file that holds the plugin's source
+    :ivar mtime: the modification time of the source when it failed, or ``None`` if unknown
+    :ivar error: the exception raised by the import
+    :ivar timestamp: the time, in seconds since the epoch, that it failed
+    """
+
+    __slots__ = ('name', 'path', 'mtime', 'error', 'timestamp')
+
+    def __init__(self, name, path, mtime, error, timestamp):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.error = error
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return '<ImportFailure %s: %r>' % (self.name, self.error)
+
+
+class ImportFailureCache(object):
+    """A bounded cache of the plugin modules that failed to import.
+
+    A failure is remembered until the plugin's source is modified, until
+    `ttl` seconds have passed or until it is evicted, least recently used
+    first, to keep the cache within `max_size` failures.
+
+    :ivar max_size: the most failures that are remembered
+    :ivar ttl: the seconds a failure is remembered for, or ``None`` for no limit
+    """
+
+    def __init__(self, max_size=256, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._failures)
+
+    def record(self, name, path, error):
+        """Remember that a plugin module failed to import.
+
+        :rtype: the :class:`ImportFailure` that was recorded
+        """
+        failure = ImportFailure(name, path, _source_mtime(path), error, time.time())
+        with self._lock:
+            self._failures.pop((name, path), None)
+            self._failures[(name, path)] = failure
+            while len(self._failures) > max(self.max_size, 0):
+                self._failures.popitem(last=False)
+        return failure
+
+    def get(self, name, path):
+        """Return the failure of a plugin module if it still holds, otherwise ``None``.
+
+        A failure no longer holds once the plugin's source has been modified
+        or the failure has expired, and it is then forgotten.
+        """
+        key = (name, path)
+        failure = self._failures.get(key)
+        if failure is None:
+            return None
+
+        expired = self.ttl is not None and time.time() - failure.timestamp >= self.ttl
+        with self._lock:
+            if expired or _source_mtime(path) != failure.mtime:
+                if self._failures.get(key) is failure:
+                    del self._failures[key]
+                return None
+            if key in self._failures:
+                self._failures.move_to_end(key)
+        return failure
+
+    def failures(self):
+        """Return a list of the failures that are remembered, least recently used first."""
+        with self._lock:
+            return list(self._failures.values())
+
+    def clear(self, name=None):
+        """Forget every failure, or only the failures of a plugin module.
+
+        :param name: the dotted name of the plugin module
+        :type name: default None, i.e. every plugin module
+        """
+        with self._lock:
+            if name is None:
+                self._failures.clear()
+            else:
+                for key in [key for key in self._failures if key[0] == name]:
+                    del self._failures[key]
+
+
+def _source_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+#: A shared cache of the plugin modules that failed to import, to pass as the `failure_cache` of discovery.
+import_failures = ImportFailureCache()
+
+
+async def collect_plugin_modules_async(namespace, methods=None, recurse=False, index=None, concurrency=1,
+                                       executor=None, failures=None, failure_cache=None):
+    """An asynchronous generator function that searches namespaces for plugin methods.
+
+    The directory walk and each import are run in an executor so that
+    the event loop is not blocked by file system access or by the code
+    plugin modules run when they are imported.
+
+    :param namespace: the root namespace to begin searching
+    :param methods: the method name or names that are to be collected
+    :type methods: a single method name or collection of names, default None
+    :param recurse: whether or not to recurse from the root namespace
+    :type recurse: default False
+    :param index: a discovery index to consult instead of listing every directory
+    :type index: :class:`PluginIndex`, default None
+    :param concurrency: the most plugin modules that are imported at once
+    :type concurrency: default 1
+    :param executor: the executor to run the walk and the imports in
+    :type executor: default None, i.e. the event loop's default executor
+    :param failures: a list to append an :class:`ImportFailure` to for each plugin module that
+        failed to import, or was skipped because it failed before
+    :type failures: default None
+    :param failure_cache: a cache to remember the plugin modules that failed to import in,
+        e.g. :data:`import_failures`; they are skipped until their source changes or the failure expires
+    :type failure_cache: :class:`ImportFailureCache`, default None
+    :rtype: Python modules that have been found beneath the indicated namespace, in the order found
+
+    ::
+
+        from livetribe.plugins import collect_plugin_modules_async
+
+        async def handle(value):
+            async for module in collect_plugin_modules_async('acme.plugins', methods=['do'], recurse=True):
+                module.do(value)
+    """
+    methods = _method_names(methods)
+
+    loop = asyncio.get_running_loop()
+    plugin_paths = await loop.run_in_executor(executor, lambda: list(_walk_plugin_paths(namespace, recurse,
+                                                                                        index=index)))
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def import_plugin(paths):
+        async with semaphore:
+            return await loop.run_in_executor(executor, lambda: list(_import_plugin_modules(
+                [paths], methods, failures=failures, failure_cache=failure_cache)))
+
+    tasks = [asyncio.ensure_future(import_plugin(paths)) for paths in plugin_paths]
+    try:
+        for task in tasks:
+            for module in await task:
+                yield module
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def collect_plugin_classes_async(namespace, subclasses_of=None, recurse=False, index=None, concurrency=1,
+                                       executor=None, failures=None, failure_cache=None):
+    """An asynchronous generator function that searches namespaces for plugin classes.
+
+    The parameters are those of :func:`collect_plugin_classes` and
+    :func:`collect_plugin_modules_async`.
+
+    :rtype: plugin classes that have been found beneath the indicated namespace
+    """
+    subclasses_of = _parent_classes(subclasses_of)
+
+    tested = {}
+    async for module in collect_plugin_modules_async(namespace, recurse=recurse, index=index,
+                                                     concurrency=concurrency, executor=executor, failures=failures,
+                                                     failure_cache=failure_cache):
+        for cls in _untested_plugin_classes(_module_classes(module), subclasses_of, tested):
+            yield cls
+
+
+async def instantiate_plugin_classes_async(plugin_classes, args=(), kwargs=None, setup=None, concurrency=None,
+                                           executor=None):
+    """An asynchronous generator function to instantiate plugin instances given a collection of plugin classes.
+
+    Each plugin class, or factory, is called in an executor with the same
+    arguments.  If it returns an awaitable, e.g. it is an ``async`` factory
+    function, the awaitable's result is the instance.  If `setup` names a
+    method of the instance it is then called, and awaited if it returns an
+    awaitable.
+
+    :param plugin_classes: a collection, or asynchronous iterable, of plugin classes or factories
+    :param args: arguments to pass to each constructor
+    :param kwargs: keyword arguments to pass to each constructor
+    :param setup: the name of a method to call on each instance once it is constructed
+    :type setup: default None
+    :param concurrency: the most plugins that are instantiated at once
+    :type concurrency: default None, i.e. no limit
+    :param executor: the executor to run the constructors in
+    :type executor: default None, i.e. the event loop's default executor
+    :rtype: plugin instances, in the order of `plugin_classes`
+
+    ::
+
+        from livetribe.plugins import collect_plugin_classes_async, instantiate_plugin_classes_async
+        from acme.framework import Factory
+
+        async def start():
+            plugin_classes = collect_plugin_classes_async('acme.plugins', subclasses_of=Factory, recurse=True)
+            async for instance in instantiate_plugin_classes_async(plugin_classes, (2, 'test'), setup='start'):
+                instance.work()
+    """
+    kwargs = kwargs or {}
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def instantiate(plugin_class):
+        if semaphore is not None:
+            async with semaphore:
+                return await _instantiate_async(loop, executor, plugin_class, args, kwargs, setup)
+        return await _instantiate_async(loop, executor, plugin_class, args, kwargs, setup)
+
+    if hasattr(plugin_classes, '__aiter__'):
+        plugin_classes = [plugin_class async for plugin_class in plugin_classes]
+
+    tasks = [asyncio.ensure_future(instantiate(plugin_class)) for plugin_class in plugin_classes]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _instantiate_async(loop, executor, plugin_class, args, kwargs, setup):
+    measurement = _listeners and _start_measurement()
+    instance = await loop.run_in_executor(executor, lambda: plugin_class(*args, **kwargs))
+    if inspect.isawaitable(instance):
+        instance = await instance
+
+    if setup is not None:
+        result = getattr(instance, setup)()
+        if inspect.isawaitable(result):
+            await result
+
+    if measurement:
+        _notify(PHASE_INSTANTIATE, _class_name(plugin_class) if isinstance(plugin_class, type)
+                else getattr(plugin_class, '__qualname__', repr(plugin_class)), *_stop_measurement(measurement))
+    return instance
+
+
+class PluginManifest(object):
+    """A manifest of the plugins beneath namespaces, recorded when a deployment is built.
+
+    For frozen or read-only deployments whose plugins never change after
+    they are built, :func:`build_plugin_manifest` records the dotted names
+    of the plugin modules beneath each namespace, the callables each
+    exports and the plugin classes found.  The manifest then imports
+    exactly those names without walking any directory.
+
+    The manifest also records the namespaces' root directories, as they
+    were resolved when it was built, and a hash of their modification
+    times.  If the hash no longer matches those directories, or a namespace
+    is not in the manifest, the manifest falls back to discovering plugins
+    as usual.
+
+    ::
+
+        from livetribe.plugins import PluginManifest
+        from acme.framework import Factory
+
+        manifest = PluginManifest('/etc/acme/plugins.manifest')
+        for plugin in manifest.collect_plugin_classes('acme.plugins', subclasses_of=Factory):
+            plugin().work()
+    """
+
+    VERSION = 2
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename) as f:
+            data = json.load(f)
+        if data.get('version') != self.VERSION:
+            raise ValueError('%s is not a version %d plugin manifest' % (filename, self.VERSION))
+        self.namespaces = data['namespaces']
+        self.roots = data['roots']
+        self.signature = data['signature']
+        self._current = None
+
+    def is_current(self):
+        """Return whether the manifest still matches the environment; this is checked once."""
+        if self._current is None:
+            self._current = _manifest_signature(self.roots) == self.signature
+            if not self._current:
+                log.info('Plugin manifest %s is stale, discovering plugins instead', self.filename)
+        return self._current
+
+    def _recorded(self, namespace, recurse):
+        recorded = self.namespaces.get(namespace)
+        if recorded is None or recorded['recurse'] != recurse or not self.is_current():
+            return None
+        return recorded
+
+    def collect_plugin_modules(self, namespace, methods=None, recurse=False):
+        """A generator function of the plugin modules recorded for a namespace.
+
+        Only the modules that export one of `methods` are imported.  The
+        parameters are those of :func:`collect_plugin_modules`.
+        """
+        recorded = self._recorded(namespace, recurse)
+        if recorded is None:
+            for module in collect_plugin_modules(namespace, methods, recurse):
+                yield module
+            return
+
+        methods = _method_names(methods)
+
+        for name, exported in recorded['modules']:
+            if methods and methods.isdisjoint(exported):
+                continue
+            try:
+                log.debug('Importing %s', name)
+                yield _import_plugin(name)
+            except ImportError:
+                log.warning('Problems importing %s', name)
+                log.debug('', exc_info=1)
+
+    def collect_plugin_classes(self, namespace, subclasses_of=None, recurse=False):
+        """A generator function of the plugin classes recorded for a namespace.
+
+        Only the modules defining the recorded classes are imported, so
+        `subclasses_of` must be, or be narrower than, the classes the
+        manifest was built with.  The parameters are those of
+        :func:`collect_plugin_classes`.
+        """
+        recorded = self._recorded(namespace, recurse)
+        if recorded is None:
+            for cls in collect_plugin_classes(namespace, subclasses_of, recurse):
+                yield cls
+            return
+
+        subclasses_of = _parent_classes(subclasses_of)
+
+        for qualified_name in recorded['classes']:
+            try:
+                cls = _resolve_qualified_name(qualified_name)
+            except (ImportError, AttributeError):
+                log.warning('Problems importing %s', qualified_name)
+                log.debug('', exc_info=1)
+                continue
+            if _is_plugin_class(cls, subclasses_of):
+                yield cls
+
+
+def build_plugin_manifest(filename, namespaces, subclasses_of=None, recurse=False, isolated=False, workers=None):
+    """Discover the plugins beneath namespaces and write a :class:`PluginManifest` of them.
+
+    :param filename: the file to write the manifest to
+    :param namespaces: the root namespace or namespaces to record
+    :type namespaces: a single namespace or collection of namespaces
+    :param subclasses_of: the parent class or classes that recorded plugin classes must be children of
+    :type subclasses_of: a single parent class or collection of classes, default None
+    :param recurse: whether or not to recurse from the root namespaces
+    :type recurse: default False
+    :param isolated: whether to import the plugins in worker processes rather than in this one,
+        see :func:`collect_plugins_isolated`
+    :type isolated: default False
+    :param workers: the most worker processes when `isolated`
+    :type workers: default None, i.e. one for each namespace, up to the number of CPUs
+    :rtype: the :class:`PluginManifest` that was written
+    """
+    if isinstance(namespaces, str):
+        namespaces = [namespaces]
+
+    if isolated:
+        recorded = collect_plugins_isolated(namespaces, subclasses_of, recurse, workers)
+    else:
+        recorded = dict((namespace, _record_namespace(namespace, subclasses_of, recurse))
+                        for namespace in namespaces)
+
+    roots = _manifest_roots(sorted(recorded))
+    _write_json(filename, {
+        'version': PluginManifest.VERSION,
+        'roots': roots,
+        'signature': _manifest_signature(roots),
+        'namespaces': recorded,
+    })
+    return PluginManifest(filename)
+
+
+def collect_plugins_isolated(namespaces, subclasses_of=None, recurse=False, workers=None):
+    """Discover the plugins beneath namespaces in worker processes, leaving this process untouched.
+
+    Each namespace is discovered in a worker process of its own, started
+    afresh rather than forked, so neither the plugin modules nor anything
+    they import are ever loaded into this process.  Only the names of what
+    was found are returned, and the caller can then import just the plugins
+    it needs, e.g. with :class:`PluginManifest` or :func:`build_plugin_manifest`
+    run as a precompute step.
+
+    :param namespaces: the root namespace or namespaces to discover
+    :type namespaces: a single namespace or collection of namespaces
+    :param subclasses_of: the parent class or classes that plugin classes must be children of;
+        the classes are pickled by reference and imported in the workers
+    :type subclasses_of: a single parent class or collection of classes, default None
+    :param recurse: whether or not to recurse from the root namespaces
+    :type recurse: default False
+    :param workers: the most worker processes
+    :type workers: default None, i.e. one for each namespace, up to the number of CPUs
+    :rtype: a dictionary, by namespace, of dictionaries whose ``modules`` are
+        ``[dotted name, exported callable names]`` pairs and whose ``classes``
+        are the ``module:qualname`` names of the plugin classes
+
+    As with any use of :mod:`multiprocessing`, the main module of a program
+    that calls this must guard its own code with ``if __name__ == '__main__':``.
+
+    ::
+
+        from livetribe.plugins import collect_plugins_isolated
+
+        found = collect_plugins_isolated(['acme.plugins', 'acme.extras'], recurse=True)
+        for namespace, recorded in found.items():
+            print(namespace, recorded['classes'])
+    """
+    if isinstance(namespaces, str):
+        namespaces = [namespaces]
+    namespaces = list(namespaces)
+    if not namespaces:
+        return {}
+
+    workers = workers or min(len(namespaces), os.cpu_count() or 1)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(_record_namespace, namespace, subclasses_of, recurse) for namespace in namespaces]
+        return dict((namespace, future.result()) for namespace, future in zip(namespaces, futures))
+
+
+def _record_namespace(namespace, subclasses_of, recurse):
+    """Return the serializable record of the plugins beneath a namespace that a manifest holds."""
+    modules = []
+    for module in collect_plugin_modules(namespace, recurse=recurse):
+        exported = sorted(attr_name for attr_name, value in list(vars(module).items())
+                          if not attr_name.startswith('_') and callable(value))
+        modules.append([module.__name__, exported])
+    classes = ['%s:%s' % (cls.__module__, getattr(cls, '__qualname__', cls.__name__))
+               for cls in collect_plugin_classes(namespace, subclasses_of, recurse)]
+    return {'recurse': recurse, 'modules': modules, 'classes': classes}
+
+
+def _manifest_roots(namespaces):
+    """Return the root directories of namespaces that a manifest is checked against."""
+    roots = []
+    for namespace in namespaces:
+        for namespace_path in _namespace_roots(namespace):
+            if os.path.isdir(namespace_path):
+                roots.append(os.path.abspath(namespace_path))
+    return roots
+
+
+def _manifest_signature(roots):
+    """Hash the modification times of a manifest's root directories, ``None`` for those that are gone."""
+    mtimes = []
+    for root in roots:
+        try:
+            mtimes.append([root, os.stat(root).st_mtime])
+        except OSError:
+            mtimes.append([root, None])
+    return hashlib.sha1(json.dumps(mtimes).encode('utf-8')).hexdigest()
+
+
+def _resolve_qualified_name(qualified_name):
+    module_name, _, attrs = qualified_name.partition(':')
+    obj = _import_plugin(module_name)
+    for attr in attrs.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def main(argv=None):
+    """Build a plugin manifest from the command line, see :func:`build_plugin_manifest`."""
+    parser = ArgumentParser(description='Record the plugins beneath namespaces in a plugin manifest.')
+    parser.add_argument('namespaces', nargs='+', help='the root namespaces to record')
+    parser.add_argument('-o', '--output', required=True, help='the manifest file to write')
+    parser.add_argument('-r', '--recurse', action='store_true', help='recurse from the root namespaces')
+    parser.add_argument('-s', '--subclasses-of', action='append', default=[], metavar='MODULE:CLASS',
+                        help='a class that recorded plugin classes must be children of, may be repeated')
+    parser.add_argument('-i', '--isolated', action='store_true',
+                        help='import the plugins in worker processes, one for each namespace')
+    options = parser.parse_args(argv)
+
+    subclasses_of = [_resolve_qualified_name(name) for name in options.subclasses_of] or None
+    manifest = build_plugin_manifest(options.output, options.namespaces, subclasses_of, options.recurse,
+                                     options.isolated)
+    for namespace, recorded in sorted(manifest.namespaces.items()):
+        sys.stdout.write('%s: %d modules, %d classes\n' % (namespace, len(recorded['modules']),
+                                                           len(recorded['classes'])))
+    return 0
+
+
+def plan_plugin_load(namespace, recurse=False, index=None):
+    """Plan the order in which to load the plugins beneath a namespace.
+
+    Plugin modules may declare, as literals assigned at module level, a
+    ``__plugin_priority__`` number, lower numbers loading first and the
+    default being 0, and ``__plugin_requires__``, a list of the dotted names
+    of the plugin modules that must be loaded before them.  These are read
+    from the plugins' sources without importing them.
+
+    :param namespace: the root namespace to begin searching
+    :param recurse: whether or not to recurse from the root namespace
+    :type recurse: default False
+    :param index: a discovery index to consult, and to cache source scans in
+    :type index: :class:`PluginIndex`, default None
+    :rtype: a :class:`PluginLoadPlan`
+
+    ::
+
+        from livetribe.plugins import plan_plugin_load
+        from acme.framework import Factory
+
+        plan = plan_plugin_load('acme.plugins', recurse=True)
+        for plugin in plan.collect_plugin_classes(subclasses_of=Factory, limit=1):
+            plugin().work()
+    """
+    handles = []
+    metadata = {}
+    for handle in collect_plugin_handles(namespace, recurse, index):
+        handles.append(handle)
+        scan = _plugin_source_scan(handle.path, index)
+        metadata[handle.name] = scan['metadata'] if scan is not None else {}
+
+    return PluginLoadPlan(handles, metadata)
+
+
+class PluginLoadPlan(object):
+    """The plugins beneath a namespace in the order they should be loaded.
+
+    Iterating over the plan yields :class:`PluginHandle` objects, none of
+    which has been imported, in an order where every plugin follows the
+    plugins it requires and, otherwise, plugins with lower priorities come
+    first and ties keep the order they were found in.  Requirements on
+    modules that are not plugins of the plan are ignored; plugins in a
+    requirement cycle are loaded by priority once nothing else can be.
+    """
+
+    def __init__(self, handles, metadata):
+        position = dict((handle.name, i) for i, handle in enumerate(handles))
+        self._handles = dict((handle.name, handle) for handle in handles)
+        self.priorities = {}
+        self.requires = {}
+        for handle in handles:
+            declared = metadata.get(handle.name, {})
+            priority = declared.get('__plugin_priority__', 0)
+            self.priorities[handle.name] = priority if isinstance(priority, (int, float)) else 0
+
+            requires = declared.get('__plugin_requires__', ())
+            if isinstance(requires, str):
+                requires = [requires]
+            self.requires[handle.name] = [name for name in requires if name in position and name != handle.name]
+
+        self._key = lambda name: (self.priorities[name], position[name])
+        self._order = self._topological_order()
+
+    def _topological_order(self):
+        dependents = dict((name, []) for name in self._handles)
+        waiting = {}
+        for name, requires in self.requires.items():
+            waiting[name] = len(requires)
+            for required in requires:
+                dependents[required].append(name)
+
+        ready = [(self._key(name), name) for name, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while len(order) < len(self._handles):
+            if not ready:
+                remaining = sorted((name for name in waiting if waiting[name] > 0), key=self._key)
+                log.warning('Plugins %s require each other, loading them by priority', ', '.join(remaining))
+                waiting[remaining[0]] = 0
+                heapq.heappush(ready, (self._key(remaining[0]), remaining[0]))
+
+            _, name = heapq.heappop(ready)
+            if waiting[name] < 0:
+                continue
+            waiting[name] = -1
+            order.append(self._handles[name])
+            for dependent in dependents[name]:
+                if waiting[dependent] > 0:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        heapq.heappush(ready, (self._key(dependent), dependent))
+        return order
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def levels(self):
+        """Return the plan as a list of levels, each a list of handles that only require earlier levels.
+
+        The plugins within a level do not depend on each other and may be
+        loaded in parallel.
+        """
+        level_of = {}
+        levels = []
+        for handle in self._order:
+            level = 1 + max([level_of[name] for name in self.requires[handle.name] if name in level_of] or [-1])
+            level_of[handle.name] = level
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(handle)
+        return levels
+
+    def load(self, workers=None):
+        """A generator function that imports the planned plugin modules in order.
+
+        :param workers: the number of threads that import the plugins within a level in parallel
+        :type workers: default None, i.e. import one plugin at a time in the planned order
+        :rtype: Python modules, level by level when `workers` is given
+        """
+        if not workers:
+            for module in _load_plugin_handles(self._order):
+                yield module
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for level in self.levels():
+                for modules in list(executor.map(lambda handle: list(_load_plugin_handles([handle])), level)):
+                    for module in modules:
+                        yield module
+
+    def collect_plugin_classes(self, subclasses_of=None, limit=None, defined_in_module=False):
+        """A generator function that imports the planned plugins in order and yields their plugin classes.
+
+        Plugins after the one that provides the `limit`-th plugin class are
+        not imported.
+
+        :param subclasses_of: the parent class or classes that plugin classes must be children of
+        :type subclasses_of: a single parent class or collection of classes, default None
+        :param limit: the most plugin classes to yield
+        :type limit: default None, i.e. no limit
+        :param defined_in_module: whether to skip classes that a plugin module imports
+            from elsewhere rather than defines itself
+        :type defined_in_module: default False
+        """
+        subclasses_of = _parent_classes(subclasses_of)
+
+        if limit is not None and limit <= 0:
+            return
+
+        tested = {}
+        found = 0
+        for module in _load_plugin_handles(self._order):
+            for cls in _untested_plugin_classes(_module_classes(module, defined_in_module), subclasses_of, tested):
+                yield cls
+                found += 1
+                if found == limit:
+                    return
+
+
+def _load_plugin_handles(handles):
+    for handle in handles:
+        try:
+            yield handle.load()
+        except ImportError:
+            log.warning('Problems importing %s', handle.name)
+            log.debug('', exc_info=1)
+
+
+def compile_plugin_dispatch(namespace, methods, recurse=False, index=None):
+    """Collect the plugin modules beneath a namespace and compile them into a :class:`PluginDispatch`.
+
+    :param namespace: the root namespace to begin searching
+    :param methods: the method name or names to dispatch
+    :type methods: a single method name or collection of names
+    :param recurse: whether or not to recurse from the root namespace
+    :type recurse: default False
+    :param index: a discovery index to consult instead of listing every directory
+    :type index: :class:`PluginIndex`, default None
+    :rtype: a :class:`PluginDispatch`
+
+    ::
+
+        from livetribe.plugins import compile_plugin_dispatch
+
+        dispatch = compile_plugin_dispatch('acme.plugins', ['do'], recurse=True)
+        for event in events:
+            dispatch.call_all('do', event)
+    """
+    if isinstance(methods, str):
+        methods = [methods]
+    return PluginDispatch(collect_plugin_modules(namespace, methods, recurse, index=index), methods)
+
+
+class PluginDispatch(object):
+    """A dispatch table of the callables that plugin modules export, by method name.
+
+    The callables are looked up once, when the table is compiled, and kept
+    in discovery order, so dispatching is a plain call of each.  A plugin
+    module may declare the key, or list of keys, it handles as the module
+    level ``__plugin_key__`` for keyed dispatch; the first plugin to declare
+    a key handles it.
+
+    :param modules: the plugin modules to compile
+    :param methods: the method names to dispatch
+    :type methods: a collection of names
+    """
+
+    def __init__(self, modules, methods):
+        callables = dict((method_name, []) for method_name in methods)
+        keyed = dict((method_name, {}) for method_name in methods)
+        for module in modules:
+            keys = getattr(module, '__plugin_key__', ())
+            if isinstance(keys, str) or not isinstance(keys, (list, tuple, set, frozenset)):
+                keys = [keys]
+            for method_name in methods:
+                method = getattr(module, method_name, None)
+                if method is None:
+                    continue
+                callables[method_name].append(method)
+                for key in keys:
+                    keyed[method_name].setdefault(key, method)
+
+        self._callables = dict((method_name, tuple(found)) for method_name, found in callables.items())
+        self._keyed = keyed
+
+    def callables(self, method_name):
+        """Return the callables exported for a method name, in discovery order.
+
+        :rtype: a tuple, which is empty if no plugin exports the method
+        """
+        return self._callables.get(method_name, ())
+
+    def keys(self, method_name):
+        """Return the keys that plugins declared for a method name."""
+        return list(self._keyed.get(method_name, ()))
+
+    def call_all(self, method_name, *args, **kwargs):
+        """Call every plugin's callable for a method name and return a list of their results."""
+        return [method(*args, **kwargs) for method in self._callables.get(method_name, ())]
+
+    def call_first(self, method_name, *args, **kwargs):
+        """Call the callable of the first plugin that exports a method name and return its result.
+
+        :raises KeyError: if no plugin exports the method
+        """
+        found = self._callables.get(method_name)
+        if not found:
+            raise KeyError(method_name)
+        return found[0](*args, **kwargs)
+
+    def call_keyed(self, method_name, key, *args, **kwargs):
+        """Call the callable of the plugin that declared a key and return its result.
+
+        :raises KeyError: if no plugin that exports the method declared the key
+        """
+        return self._keyed.get(method_name, {})[key](*args, **kwargs)
+
+    def map_all(self, method_name, items):
+        """Call every plugin's callable on each item.
+
+        :rtype: a list, for each item, of the list of the plugins' results
+        """
+        found = self._callables.get(method_name, ())
+        return [[method(item) for method in found] for item in items]
+
+    def map_keyed(self, method_name, keyed_items):
+        """Call, for each ``(key, item)`` pair, the callable of the plugin that declared the key on the item.
+
+        :rtype: a list of the results, in the order of `keyed_items`
+        :raises KeyError: if no plugin that exports the method declared one of the keys
+        """
+        keyed = self._keyed.get(method_name, {})
+        return [keyed[key](item) for key, item in keyed_items]
+
+
+def fan_out_plugin_method(namespace, method_name, items, recurse=False, index=None, chunk_size=64, workers=None,
+                          processes=False, max_pending=None):
+    """A generator function that calls a method of every plugin beneath a namespace on chunks of inputs.
+
+    The inputs are split into chunks of `chunk_size` items and every plugin
+    module that exports `method_name` is called on each chunk on a pool of
+    threads or processes.  A plugin that also exports a batch variant, the
+    method name suffixed with ``_batch``, e.g. ``do_batch``, is given each
+    chunk as a list and must return a result for each of its items;
+    otherwise the method is called on every item.
+
+    :param namespace: the root namespace to begin searching
+    :param method_name: the name of the method to call
+    :param items: the inputs, which are read as work is submitted
+    :param recurse: whether or not to recurse from the root namespace
+    :type recurse: default False
+    :param index: a discovery index to consult instead of listing every directory
+    :type index: :class:`PluginIndex`, default None
+    :param chunk_size: the most inputs given to a plugin at once
+    :type chunk_size: default 64
+    :param workers: the size of the pool
+    :type workers: default None, i.e. the executor's default
+    :param processes: whether to use a pool of processes rather than threads
+    :type processes: default False
+    :param max_pending: the most chunks that are in flight at once
+    :type max_pending: default None, i.e. twice the number of workers
+    :rtype: a :class:`PluginBatchResult` for each plugin and chunk, chunk by chunk in the order
+        of the inputs and then in the order the plugins were found
+
+    Only `max_pending` chunks are read from `items` ahead of the results
+    that have been consumed, so a slow consumer or slow plugins hold back
+    reading further inputs.  A plugin that raises does not stop the others,
+    its exception is recorded in its :class:`PluginBatchResult`.  With
+    ``processes=True`` the plugins are imported in the worker processes and
+    the inputs and results must be picklable.
+
+    ::
+
+        from livetribe.plugins import fan_out_plugin_method
+
+        for batch in fan_out_plugin_method('acme.plugins', 'do', records, chunk_size=256, workers=4):
+            if batch.error is None:
+                store(batch.name, batch.start, batch.results)
+    """
+    names = [module.__name__ for module in collect_plugin_modules(namespace, [method_name], recurse, index=index)]
+    if not names:
+        return
+
+    if workers is None:
+        # the defaults of ProcessPoolExecutor and, since Python 3.8, ThreadPoolExecutor
+        cpus = os.cpu_count() or 1
+        workers = cpus if processes else min(32, cpus + 4)
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        pending = deque()
+        items = iter(items)
+        start = 0
+        while True:
+            chunk = list(itertools.islice(items, chunk_size))
+            if chunk:
+                futures = [executor.submit(_call_plugin_batch, name, method_name, chunk) for name in names]
+                pending.append((start, futures))
+                start += len(chunk)
+            if pending and (not chunk or len(pending) >= max(max_pending, 1)):
+                chunk_start, futures = pending.popleft()
+                for name, future in zip(names, futures):
+                    results, error, seconds = future.result()
+                    if error is not None:
+                        log.warning('Problems calling %s.%s', name, method_name)
+                    yield PluginBatchResult(name, chunk_start, results, error, seconds)
+            elif not chunk:
+                return
+
+
+def _call_plugin_batch(name, method_name, chunk):
+    start = time.perf_counter()
+    try:
+        module = _import_plugin(name)
+        batch = getattr(module, method_name + '_batch', None)
+        if batch is not None:
+            results = list(batch(chunk))
+        else:
+            method = getattr(module, method_name)
+            results = [method(item) for item in chunk]
+        error = None
+    except Exception as e:
+        results, error = None, e
+    return results, error, time.perf_counter() - start
+
+
+class PluginBatchResult(object):
+    """The outcome of calling a plugin on a chunk of inputs.
+
+    :ivar name: the dotted name of the plugin module
+    :ivar start: the position of the chunk's first item among all the inputs
+    :ivar results: a list of the results for the chunk's items, or ``None`` if the plugin raised
+    :ivar error: the exception the plugin raised, or ``None``
+    :ivar seconds: the seconds the plugin took on the chunk
+    """
+
+    __slots__ = ('name', 'start', 'results', 'error', 'seconds')
+
+    def __init__(self, name, start, results, error, seconds):
+        self.name = name
+        self.start = start
+        self.results = results
+        self.error = error
+        self.seconds = seconds
+
+    def __repr__(self):
+        outcome = 'error=%r' % (self.error, ) if self.error is not None else '%d results' % len(self.results)
+        return '<PluginBatchResult %s@%d %s>' % (self.name, self.start, outcome)
+
+
+class SharedPluginDiscovery(object):
+    """Discovery results shared between threads, each discovered only once.
+
+    The first thread to ask for the plugins of a namespace discovers them,
+    threads that ask meanwhile wait for and share its result, and later
+    threads read the published result without taking any lock.  Results
+    are immutable tuples, published by replacing the dictionary of results
+    as a whole, so readers never see a partially built one.  If discovery
+    raises, the waiting threads raise the same exception and the next
+    request tries again.
+
+    A thread that asks for a namespace it is itself discovering, e.g. from
+    the code of a plugin module being imported, discovers it again without
+    sharing rather than waiting on itself.  A discovery that was in flight
+    when its results were invalidated is not published, and results holding
+    modules that a :class:`PluginScope` unloads are dropped.
+
+    ::
+
+        from livetribe.plugins import shared_discovery
+        from acme.framework import Factory
+
+        # in each worker thread
+        for plugin in shared_discovery.collect_plugin_classes('acme.plugins', subclasses_of=Factory):
+            plugin().work()
+    """
+
+    def __init__(self):
+        self._snapshots = {}
+        self._flights = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def collect_plugin_classes(self, namespace, subclasses_of=None, recurse=False):
+        """Return the plugin classes beneath a namespace, as :func:`collect_plugin_classes` finds them.
+
+        :rtype: a tuple of plugin classes
+        """
+        subclasses_of = _parent_classes(subclasses_of)
+        key = ('classes', namespace, subclasses_of, recurse)
+        return self._shared(key, lambda: collect_plugin_classes(namespace, subclasses_of, recurse))
+
+    def collect_plugin_modules(self, namespace, methods=None, recurse=False):
+        """Return the plugin modules beneath a namespace, as :func:`collect_plugin_modules` finds them.
+
+        :rtype: a tuple of plugin modules
+        """
+        if isinstance(methods, str):
+            methods = [methods]
+        methods = _method_names(methods)
+        key = ('modules', namespace, methods, recurse)
+        return self._shared(key, lambda: collect_plugin_modules(namespace, methods, recurse))
+
+    def invalidate(self, namespace=None):
+        """Forget the published results, or only those of a namespace, so they are discovered again.
+
+        :param namespace: the root namespace
+        :type namespace: default None, i.e. every namespace
+        """
+        with self._lock:
+            self._drop(lambda key, snapshot: namespace is None or key[1] == namespace)
+
+    def _forget_plugin_modules(self, names):
+        def holds_unloaded(key, snapshot):
+            return any(getattr(value, '__module__', None) in names or getattr(value, '__name__', None) in names
+                       for value in snapshot)
+
+        with self._lock:
+            self._drop(holds_unloaded)
+
+    def _drop(self, dropped):
+        """Drop the published results, and the discoveries in flight, that match; the lock must be held."""
+        self._generation += 1
+        self._snapshots = dict((key, snapshot) for key, snapshot in self._snapshots.items()
+                               if not dropped(key, snapshot))
+        # discoveries in flight are no longer shared with new callers, nor published
+        self._flights = {}
+
+    def _shared(self, key, discover):
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                return snapshot
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _DiscoveryFlight(self._generation)
+
+        if not leader:
+            if flight.thread == threading.get_ident():
+                log.debug('Discovering %s again, it is already being discovered by this thread', key[1])
+                return tuple(discover())
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = tuple(discover())
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                published = flight.error is None and flight.generation == self._generation
+                if published:
+                    snapshots = dict(self._snapshots)
+                    snapshots[key] = flight.result
+                    self._snapshots = snapshots
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        if published:
+            _hold_plugin_modules(self)
+        return flight.result
+
+
+class _DiscoveryFlight(object):
+    """A discovery in progress that other threads can wait on."""
+
+    __slots__ = ('thread', 'generation', 'done', 'result', 'error')
+
+    def __init__(self, generation):
+        self.thread = threading.get_ident()
+        self.generation = generation
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+#: The discovery results shared by every thread of the process.
+shared_discovery = SharedPluginDiscovery()
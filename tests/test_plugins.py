@@ -14,11 +14,72 @@
 # specific language governing permissions and limitations
 # under the License.
 #
+import asyncio
+from contextlib import contextmanager
+import json
 import os
+import shutil
 import sys
+import tempfile
+import zipfile
 from types import ModuleType
 
 from livetribe.plugins import collect_plugin_classes, instantiate_plugin_classes, collect_plugin_modules, _collect_plugin_paths, _is_package
+from livetribe.plugins import PluginIndex, build_plugin_index, collect_plugin_handles
+from livetribe.plugins import instantiate_plugin_classes_concurrently, PluginWatcher, PluginRegistry
+from livetribe.plugins import collect_plugin_entry_points, PluginEntryPoint, PluginStats, ImportFailureCache, import_failures
+from livetribe.plugins import collect_plugin_modules_async, collect_plugin_classes_async, instantiate_plugin_classes_async
+from livetribe.plugins import PluginManifest, build_plugin_manifest, plan_plugin_load, find_first_plugin_module
+from livetribe.plugins import collect_plugin_records, PluginScope, PluginInstanceCache, PluginInstancePool
+from livetribe.plugins import compile_plugin_dispatch, fan_out_plugin_method, collect_plugins_isolated
+from livetribe.plugins import SharedPluginDiscovery
+
+
+def _make_plugin_tree(root, files):
+    """Write a plugin source tree beneath root from a mapping of relative paths to source."""
+    for relative_path, source in files.items():
+        path = os.path.join(root, *relative_path.split('/'))
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as f:
+            f.write(source)
+
+
+def _forget_modules(prefix):
+    for name in list(sys.modules):
+        if name == prefix or name.startswith(prefix + '.'):
+            del sys.modules[name]
+
+
+@contextmanager
+def _plugin_tree(files, forget=(), archive=False):
+    """Write a plugin source tree to a temporary directory and put it at the front of ``sys.path``.
+
+    With `archive` the tree is written to a zip archive in the directory
+    instead, and the archive is put on ``sys.path``.  The directory is
+    yielded, and on exit it is removed along with the modules whose dotted
+    names start with one of the `forget` prefixes.
+    """
+    root = tempfile.mkdtemp()
+    path = root
+    try:
+        if archive:
+            path = os.path.join(root, 'plugins.zip')
+            with zipfile.ZipFile(path, 'w') as zf:
+                for relative_path, source in files.items():
+                    zf.writestr(relative_path, source)
+        else:
+            _make_plugin_tree(root, files)
+        sys.path.insert(0, path)
+        try:
+            yield root
+        finally:
+            sys.path.remove(path)
+            for prefix in forget:
+                _forget_modules(prefix)
+    finally:
+        shutil.rmtree(root)
 
 
 def test_collect_plugin_classes():
@@ -101,3 +162,865 @@ def test_collect_plugin_paths():
 
 def test_package():
     assert _is_package(os.path.join(os.path.dirname(__file__), 'acme'))
+
+
+def test_plugin_index():
+    with _plugin_tree({
+        'idxplugins/__init__.py': '',
+        'idxplugins/alpha.py': 'def do(i):\n    return i\n',
+        'idxplugins/sub/__init__.py': '',
+        'idxplugins/sub/beta.py': '',
+        'idxplugins/notapackage/gamma.py': '',
+    }, forget=['idxplugins']) as root:
+        filename = os.path.join(root, 'plugins.idx')
+
+        index = build_plugin_index(filename, 'idxplugins', recurse=True)
+        assert os.path.exists(filename)
+        assert len(index) == 3
+
+        expected = set(_collect_plugin_paths('idxplugins', True))
+        assert expected == set(['idxplugins/alpha.py', 'idxplugins.sub/beta.py', 'idxplugins/sub'])
+
+        index = PluginIndex(filename)
+        assert len(index) == 3
+        assert set(_collect_plugin_paths('idxplugins', True, index=index)) == expected
+
+        modules = [module.__name__ for module in collect_plugin_modules('idxplugins', recurse=True, methods=['do'], index=index)]
+        assert modules == ['idxplugins.alpha']
+
+        _make_plugin_tree(root, {'idxplugins/notapackage/__init__.py': ''})
+        paths = set(_collect_plugin_paths('idxplugins', True, index=index))
+        assert paths == expected | set(['idxplugins/notapackage', 'idxplugins.notapackage/gamma.py'])
+        assert PluginIndex(filename).listing(os.path.join(root, 'idxplugins', 'notapackage'))['package']
+
+        shutil.rmtree(os.path.join(root, 'idxplugins', 'sub'))
+        assert set(_collect_plugin_paths('idxplugins', True, index=index)) == set(['idxplugins/alpha.py', 'idxplugins/notapackage', 'idxplugins.notapackage/gamma.py'])
+        assert len(PluginIndex(filename)) == 2
+
+        with open(filename, 'w') as f:
+            json.dump({'version': PluginIndex.VERSION, 'directories': {'/x': [1]}}, f)
+        assert len(PluginIndex(filename)) == 0
+
+
+def test_collect_plugin_classes_static():
+    from acme.framework.factory import Factory
+
+    expected = set(collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True))
+    assert set(collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True, static=True)) == expected
+
+    with _plugin_tree({
+        'staticplugins/__init__.py': '',
+        'staticplugins/plain.py': 'def do(i):\n    return i\n',
+        'staticplugins/unrelated.py': 'class Unrelated(object):\n    pass\n',
+        'staticplugins/aliased.py': 'from acme.framework.factory import Factory as Base\n\n'
+                                    'class Aliased(Base):\n    pass\n',
+        'staticplugins/indirect.py': 'from acme.framework import factory\n\n'
+                                     'class Intermediate(factory.Factory):\n    pass\n\n'
+                                     'class Indirect(Intermediate):\n    pass\n',
+        'staticplugins/unresolved.py': 'from staticplugins_base import Base\n\n'
+                                       'class Unresolved(Base):\n    pass\n',
+        'staticplugins_base.py': 'from acme.framework.factory import Factory\n\n'
+                                 'class Base(Factory):\n    pass\n',
+    }, forget=['staticplugins', 'staticplugins_base']) as root:
+        index = PluginIndex()
+
+        names = set(cls.__name__ for cls in collect_plugin_classes('staticplugins', subclasses_of=Factory,
+                                                                   static=True, index=index))
+        assert names == set(['Aliased', 'Intermediate', 'Indirect', 'Unresolved', 'Base'])
+        assert 'staticplugins.plain' not in sys.modules
+        assert 'staticplugins.unrelated' not in sys.modules
+
+        scans = len(index._sources)
+        assert scans == 5
+        list(collect_plugin_classes('staticplugins', subclasses_of=Factory, static=True, index=index))
+        assert len(index._sources) == scans
+
+        for i in range(3):
+            _make_plugin_tree(root, {'staticplugins/plain.py': 'def do(i):\n    return %d\n' % i})
+            list(collect_plugin_classes('staticplugins', subclasses_of=Factory, static=True, index=index))
+        assert len(index._sources) == scans
+
+        os.remove(os.path.join(root, 'staticplugins', 'plain.py'))
+        os.utime(os.path.join(root, 'staticplugins'), (0, 0))
+        list(collect_plugin_classes('staticplugins', subclasses_of=Factory, static=True, index=index))
+        assert len(index._sources) == scans - 1
+
+
+def test_collect_plugin_classes_static_conditional():
+    from acme.framework.factory import Factory
+
+    with _plugin_tree({
+        'conditionalplugins/__init__.py': '',
+        'conditionalplugins/versioned.py': 'import sys\nfrom acme.framework.factory import Factory\n\n'
+                                           'if sys.version_info >= (3, ):\n'
+                                           '    class Versioned(Factory):\n        pass\n',
+        'conditionalplugins/optional.py': 'try:\n    from acme.framework.factory import Factory\n'
+                                          'except ImportError:\n    Factory = None\n'
+                                          'else:\n    class Optional(Factory):\n        pass\n',
+        'conditionalplugins/unrelated.py': 'if True:\n    class Unrelated(object):\n        pass\n',
+    }, forget=['conditionalplugins']):
+        expected = set(cls.__name__ for cls in collect_plugin_classes('conditionalplugins', subclasses_of=Factory))
+        assert expected == set(['Versioned', 'Optional'])
+        _forget_modules('conditionalplugins')
+
+        names = set(cls.__name__ for cls in collect_plugin_classes('conditionalplugins', subclasses_of=Factory,
+                                                                   static=True))
+        assert names == expected
+        assert 'conditionalplugins.unrelated' not in sys.modules
+
+
+def test_collect_plugin_handles():
+    handles = dict((handle.name, handle) for handle in collect_plugin_handles('acme.plugins', recurse=True))
+    assert set(handles) == set(['acme.plugins.mock', 'acme.plugins.mock.factory',
+                                'acme.plugins.mock.submodule', 'acme.plugins.mock.submodule.factory'])
+
+    handle = handles['acme.plugins.mock']
+    assert handle.is_package
+    assert handle.path.endswith(os.path.join('acme', 'plugins', 'mock', '__init__.py'))
+    assert not handles['acme.plugins.mock.factory'].is_package
+    assert handles['acme.plugins.mock.factory'].path.endswith(os.path.join('mock', 'factory.py'))
+
+    with _plugin_tree({
+        'lazyplugins/__init__.py': '',
+        'lazyplugins/alpha.py': 'def do(i):\n    return "alpha:%s" % i\n',
+    }, forget=['lazyplugins']):
+        handle, = collect_plugin_handles('lazyplugins')
+        assert handle.name == 'lazyplugins.alpha'
+        assert not handle.loaded
+        assert 'lazyplugins.alpha' not in sys.modules
+
+        assert handle.do(1) == 'alpha:1'
+        assert handle.loaded
+        assert handle.load() is sys.modules['lazyplugins.alpha']
+
+
+def test_collect_plugin_modules_workers():
+    expected = [module.__name__ for module in collect_plugin_modules('acme.plugins', recurse=True)]
+
+    load_times = {}
+    modules = [module.__name__ for module in collect_plugin_modules('acme.plugins', recurse=True, workers=4,
+                                                                      load_times=load_times)]
+    assert modules == expected
+    assert set(load_times) == set(expected)
+    assert all(seconds >= 0 for seconds in load_times.values())
+
+    files = dict(('workerplugins/plugin%02d.py' % i, 'VALUE = %d\n' % i) for i in range(20))
+    files.update({'workerplugins/__init__.py': '', 'workerplugins/broken.py': 'import nonexistent_module\n'})
+    with _plugin_tree(files, forget=['workerplugins']):
+        load_times = {}
+        modules = list(collect_plugin_modules('workerplugins', workers=4, load_times=load_times))
+        assert [module.__name__ for module in modules] == [name for name in load_times if name != 'workerplugins.broken']
+        assert sorted(module.VALUE for module in modules) == list(range(20))
+        assert 'workerplugins.broken' in load_times
+
+
+def test_instantiate_plugin_classes_concurrently():
+    from acme.framework.factory import Factory
+
+    class Broken(Factory):
+        def __init__(self, widget, append_widget=False):
+            raise ValueError(widget)
+
+    plugin_classes = sorted(collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True),
+                            key=lambda cls: cls.__module__)
+    assert len(plugin_classes) == 2
+
+    results = instantiate_plugin_classes_concurrently(plugin_classes[:1] + [Broken] + plugin_classes[1:],
+                                                      (2, ), {'append_widget': True}, workers=3)
+    assert [result.plugin_class for result in results] == plugin_classes[:1] + [Broken] + plugin_classes[1:]
+    assert isinstance(results[1].error, ValueError)
+    assert results[1].instance is None
+    assert [result.instance.work() for result in results if result.error is None] == \
+        ['acme.plugins.mock.factory:2', 'acme.plugins.mock.submodule.factory:2']
+
+    results = instantiate_plugin_classes_concurrently(plugin_classes, (3, ), {'append_widget': True},
+                                                      workers=2, processes=True)
+    assert [result.instance.work() for result in results] == \
+        ['acme.plugins.mock.factory:3', 'acme.plugins.mock.submodule.factory:3']
+    assert all(result.seconds >= 0 for result in results)
+
+
+def test_plugin_watcher():
+    with _plugin_tree({
+        'watchedplugins/__init__.py': '',
+        'watchedplugins/alpha.py': 'VALUE = 1\n',
+        'watchedplugins/sub/__init__.py': '',
+    }, forget=['watchedplugins']) as root:
+        watcher = PluginWatcher('watchedplugins', recurse=True)
+
+        changes = watcher.scan()
+        assert sorted(changes.added) == ['watchedplugins.alpha', 'watchedplugins.sub']
+        assert watcher.modules['watchedplugins.alpha'].VALUE == 1
+
+        changes = watcher.scan()
+        assert not changes
+
+        _make_plugin_tree(root, {
+            'watchedplugins/sub/beta.py': 'VALUE = 2\n',
+            'watchedplugins/broken.py': 'import nonexistent_module\n',
+        })
+        changes = watcher.scan()
+        assert sorted(changes.added) == ['watchedplugins.broken', 'watchedplugins.sub.beta']
+        assert changes.failed == ['watchedplugins.broken']
+        assert watcher.modules['watchedplugins.sub.beta'].VALUE == 2
+        assert 'watchedplugins.broken' not in watcher.modules
+        assert not watcher.scan()
+
+        alpha = os.path.join(root, 'watchedplugins', 'alpha.py')
+        _make_plugin_tree(root, {'watchedplugins/alpha.py': 'VALUE = 10\n'})
+        st = os.stat(alpha)
+        os.utime(alpha, (st.st_atime, st.st_mtime + 10))
+        changes = watcher.scan()
+        assert changes.changed == ['watchedplugins.alpha'] and not changes.added
+        assert watcher.modules['watchedplugins.alpha'].VALUE == 10
+
+        os.remove(os.path.join(root, 'watchedplugins', 'sub', 'beta.py'))
+        changes = watcher.scan()
+        assert changes.removed == ['watchedplugins.sub.beta']
+        assert 'watchedplugins.sub.beta' not in watcher.modules
+        assert 'watchedplugins.sub.beta' not in sys.modules
+
+
+def test_plugin_registry():
+    from acme.framework.factory import Factory
+
+    registry = PluginRegistry('acme.plugins', recurse=True)
+    assert len(registry) == 4
+    assert 'acme.plugins.mock.factory' in registry
+    assert registry.module('acme.plugins.mock').__name__ == 'acme.plugins.mock'
+
+    expected = set(collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True))
+    assert set(registry.subclasses_of(Factory)) == expected
+    assert len(registry.subclasses_of(Factory)) == 2
+    assert registry.subclasses_of(ValueError) == ()
+
+    providers = registry.providers_of('do')
+    assert set(module.__name__ for module in providers) == set(['acme.plugins.mock', 'acme.plugins.mock.submodule'])
+    assert registry.providers_of('missing') == ()
+
+    try:
+        registry.module('acme.plugins')
+        assert False, 'the root namespace is not a plugin'
+    except KeyError:
+        pass
+
+
+def test_collect_plugin_paths_lists_each_directory_once():
+    listed = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        listed.append(path)
+        return scandir(path)
+
+    with _plugin_tree({
+        'walkplugins/__init__.py': '',
+        'walkplugins/alpha.py': '',
+        'walkplugins/sub/__init__.py': '',
+        'walkplugins/sub/beta.py': '',
+        'walkplugins/sub/deeper/__init__.py': '',
+        'walkplugins/sub/deeper/gamma.py': '',
+        'walkplugins/__pycache__/alpha.cpython.pyc': '',
+        'walkplugins/sub/static-files/index.html': '',
+    }, forget=['walkplugins']):
+        __import__('walkplugins')
+
+        os.scandir = counting_scandir
+        try:
+            paths = set(_collect_plugin_paths('walkplugins', True))
+        finally:
+            os.scandir = scandir
+
+        assert paths == set(['walkplugins/alpha.py', 'walkplugins/sub', 'walkplugins.sub/beta.py',
+                             'walkplugins.sub/deeper', 'walkplugins.sub.deeper/gamma.py'])
+        assert len(listed) == 3
+        assert len(set(listed)) == 3
+
+
+def test_collect_plugins_from_zip_archive():
+    from acme.framework.factory import Factory
+    from livetribe import plugins
+
+    with _plugin_tree({
+        'zipplugins/__init__.py': '',
+        'zipplugins/alpha.py': 'def do(i):\n    return "alpha:%s" % i\n',
+        'zipplugins/sub/__init__.py': '',
+        'zipplugins/sub/beta.py': 'from acme.framework.factory import Factory\n\n'
+                                  'class Beta(Factory):\n    pass\n',
+        'zipplugins/sub/data.txt': '',
+        'zipplugins/notapackage/gamma.py': '',
+    }, forget=['zipplugins'], archive=True) as root:
+        archive = os.path.join(root, 'plugins.zip')
+        assert set(_collect_plugin_paths('zipplugins', True)) == set(['zipplugins/alpha.py', 'zipplugins/sub',
+                                                                      'zipplugins.sub/beta.py'])
+        assert list(_collect_plugin_paths('zipplugins', False, index=PluginIndex())) == ['zipplugins/alpha.py',
+                                                                                           'zipplugins/sub']
+
+        modules = [module.__name__ for module in collect_plugin_modules('zipplugins', recurse=True, methods=['do'])]
+        assert modules == ['zipplugins.alpha']
+
+        plugin_classes = list(collect_plugin_classes('zipplugins', subclasses_of=Factory, recurse=True, static=True))
+        assert [cls.__name__ for cls in plugin_classes] == ['Beta']
+
+        handles = dict((handle.name, handle) for handle in collect_plugin_handles('zipplugins', recurse=True))
+        assert handles['zipplugins.sub'].is_package
+        assert handles['zipplugins.alpha'].path == os.path.join(archive, 'zipplugins', 'alpha.py')
+
+        assert archive in plugins._archives
+
+
+def test_collect_plugin_entry_points():
+    from acme.framework.factory import Factory
+    from livetribe import plugins
+
+    with _plugin_tree({
+        'entryplugins.py': 'from acme.framework.factory import Factory\n\n'
+                           'class EntryFactory(Factory):\n    pass\n',
+        'entrydist-1.0.dist-info/METADATA': 'Metadata-Version: 2.1\nName: entrydist\nVersion: 1.0\n',
+        'entrydist-1.0.dist-info/entry_points.txt': '[acme.factories]\n'
+                                                    'entry = entryplugins:EntryFactory\n'
+                                                    'module = entryplugins\n'
+                                                    'missing = entryplugins:Missing\n',
+    }, forget=['entryplugins']):
+        entry_points = dict((entry_point.name, entry_point) for entry_point in collect_plugin_entry_points('acme.factories'))
+        assert set(entry_points) == set(['entry', 'module', 'missing'])
+        assert entry_points['entry'].distribution == 'entrydist'
+        assert 'entryplugins' not in sys.modules
+        assert entry_points['entry'].load().__name__ == 'EntryFactory'
+
+        names = [cls.__name__ for cls in collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True,
+                                                                 entry_point_group='acme.factories')]
+        assert sorted(names) == ['EntryFactory', 'MockFactory', 'MockFactory']
+
+        index = PluginIndex()
+        assert len(list(collect_plugin_entry_points('acme.factories', index=index))) == 3
+
+        entry_points = plugins._entry_points
+        plugins._entry_points = None
+        try:
+            assert len(list(collect_plugin_entry_points('acme.factories', index=index))) == 3
+        finally:
+            plugins._entry_points = entry_points
+
+
+def test_plugin_stats():
+    from acme.framework.factory import Factory
+
+    with PluginStats() as stats:
+        plugin_classes = collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True)
+        instances = list(instantiate_plugin_classes(plugin_classes, 2))
+    assert len(instances) == 2
+
+    phases = {}
+    for phase, name, seconds, memory in stats.events:
+        assert seconds >= 0
+        phases.setdefault(phase, set()).add(name)
+
+    assert set(phases) == set(['scan', 'import', 'attributes', 'instantiate'])
+    assert phases['import'] == set(['acme.plugins.mock', 'acme.plugins.mock.factory',
+                                    'acme.plugins.mock.submodule', 'acme.plugins.mock.submodule.factory'])
+    assert phases['attributes'] == phases['import']
+    assert phases['instantiate'] == set(['acme.plugins.mock.factory.MockFactory',
+                                         'acme.plugins.mock.submodule.factory.MockFactory'])
+    assert all(name.endswith(os.path.join('acme', 'plugins')) for name in phases['scan'])
+
+    assert len(stats.slowest(3)) == 3
+    report = stats.report(limit=3)
+    assert 'import' in report and 'acme.plugins' in report
+
+
+def test_collect_plugin_classes_reexported():
+    from acme.framework.factory import Factory
+
+    with _plugin_tree({
+        'exportplugins/__init__.py': '',
+        'exportplugins/alpha.py': 'from acme.framework.factory import Factory\n\n'
+                                  'class Alpha(Factory):\n    pass\n',
+        'exportplugins/beta.py': 'import os\n'
+                                 'from acme.framework.factory import Factory\n'
+                                 'from exportplugins.alpha import Alpha\n\n'
+                                 'class Beta(Factory):\n    pass\n',
+    }, forget=['exportplugins']):
+        names = [cls.__name__ for cls in collect_plugin_classes('exportplugins', subclasses_of=Factory)]
+        assert sorted(names) == ['Alpha', 'Beta']
+
+        names = [cls.__name__ for cls in collect_plugin_classes('exportplugins')]
+        assert sorted(names) == ['Alpha', 'Beta', 'Factory']
+
+        names = [cls.__name__ for cls in collect_plugin_classes('exportplugins', defined_in_module=True)]
+        assert sorted(names) == ['Alpha', 'Beta']
+
+
+def test_import_failures():
+    with _plugin_tree({
+        'failingplugins/__init__.py': '',
+        'failingplugins/good.py': '',
+        'failingplugins/broken.py': 'import sys\n'
+                                    'sys.modules["failingplugins"].attempts += 1\n'
+                                    'import nonexistent_module\n',
+        'failingplugins/other.py': 'import nonexistent_module\n',
+    }, forget=['failingplugins']) as root:
+        package = __import__('failingplugins')
+        package.attempts = 0
+
+        failures = []
+        modules = [module.__name__ for module in collect_plugin_modules('failingplugins', failures=failures)]
+        assert modules == ['failingplugins.good']
+        assert package.attempts == 1
+        assert sorted(failure.name for failure in failures) == ['failingplugins.broken', 'failingplugins.other']
+        assert all(isinstance(failure.error, ImportError) for failure in failures)
+
+        list(collect_plugin_modules('failingplugins'))
+        assert package.attempts == 2
+        assert len(import_failures) == 0
+
+        cache = ImportFailureCache()
+        list(collect_plugin_modules('failingplugins', failure_cache=cache))
+        assert package.attempts == 3
+        assert len(cache) == 2
+
+        failures = []
+        assert len(list(collect_plugin_modules('failingplugins', failures=failures, failure_cache=cache))) == 1
+        assert package.attempts == 3
+        assert len(failures) == 2
+
+        broken = os.path.join(root, 'failingplugins', 'broken.py')
+        st = os.stat(broken)
+        os.utime(broken, (st.st_atime, st.st_mtime + 10))
+        list(collect_plugin_modules('failingplugins', failure_cache=cache))
+        assert package.attempts == 4
+
+        cache.ttl = 0
+        list(collect_plugin_modules('failingplugins', failure_cache=cache))
+        assert package.attempts == 5
+
+        cache.ttl = None
+        cache.clear('failingplugins.broken')
+        assert [failure.name for failure in cache.failures()] == ['failingplugins.other']
+
+        cache.clear()
+        cache.max_size = 1
+        list(collect_plugin_modules('failingplugins', failure_cache=cache))
+        assert len(cache) == 1
+
+
+def test_collect_plugins_async():
+    from acme.framework.factory import Factory
+
+    class AsyncSetupFactory(Factory):
+        async def start(self):
+            await asyncio.sleep(0)
+            self.started = True
+
+    async def async_factory(widget, append_widget=False):
+        await asyncio.sleep(0)
+        instance = AsyncSetupFactory(widget, append_widget)
+        instance.from_factory = True
+        return instance
+
+    async def collect():
+        modules = [module.__name__ async for module in collect_plugin_modules_async('acme.plugins', recurse=True,
+                                                                                    concurrency=4)]
+        do_modules = [module.__name__ async for module in collect_plugin_modules_async('acme.plugins', methods=['do'],
+                                                                                       recurse=True)]
+        plugin_classes = collect_plugin_classes_async('acme.plugins', subclasses_of=Factory, recurse=True)
+        works = [instance.work() async for instance in instantiate_plugin_classes_async(plugin_classes, (2, ),
+                                                                                        {'append_widget': True},
+                                                                                        concurrency=2)]
+        instances = [instance async for instance in instantiate_plugin_classes_async([AsyncSetupFactory,
+                                                                                      async_factory],
+                                                                                     (2, ), setup='start')]
+        return modules, do_modules, works, instances
+
+    modules, do_modules, works, instances = asyncio.run(collect())
+    assert modules == [module.__name__ for module in collect_plugin_modules('acme.plugins', recurse=True)]
+    assert set(do_modules) == set(['acme.plugins.mock', 'acme.plugins.mock.submodule'])
+    assert sorted(works) == ['acme.plugins.mock.factory:2', 'acme.plugins.mock.submodule.factory:2']
+    assert all(instance.started for instance in instances)
+    assert getattr(instances[1], 'from_factory', False)
+
+
+def test_plugin_manifest():
+    from acme.framework.factory import Factory
+    from livetribe import plugins
+
+    with _plugin_tree({
+        'manifestplugins/__init__.py': '',
+        'manifestplugins/alpha.py': 'from acme.framework.factory import Factory\n\n'
+                                    'class Alpha(Factory):\n    pass\n',
+        'manifestplugins/beta.py': 'def do(i):\n    return i\n',
+    }, forget=['manifestplugins']) as root:
+        filename = os.path.join(root, 'plugins.manifest')
+        # a directory of the same name further along sys.path that is not a package
+        stray = os.path.join(root, 'stray')
+        _make_plugin_tree(stray, {'manifestplugins/README.txt': ''})
+        sys.path.append(stray)
+        try:
+            assert plugins.main(['-o', filename, '-r', '-s', 'acme.framework.factory:Factory',
+                                 'manifestplugins', 'acme.plugins']) == 0
+            _forget_modules('manifestplugins')
+
+            manifest = PluginManifest(filename)
+            assert manifest.is_current()
+        finally:
+            sys.path.remove(stray)
+
+        walk = plugins._walk_plugin_paths
+        plugins._walk_plugin_paths = None
+        try:
+            classes = list(manifest.collect_plugin_classes('manifestplugins', subclasses_of=Factory, recurse=True))
+            assert [cls.__name__ for cls in classes] == ['Alpha']
+            assert 'manifestplugins.beta' not in sys.modules
+
+            modules = list(manifest.collect_plugin_modules('manifestplugins', methods=['do'], recurse=True))
+            assert [module.__name__ for module in modules] == ['manifestplugins.beta']
+
+            assert len(list(manifest.collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True))) == 2
+        finally:
+            plugins._walk_plugin_paths = walk
+
+        _make_plugin_tree(root, {'manifestplugins/gamma.py': ''})
+        manifest = PluginManifest(filename)
+        assert not manifest.is_current()
+        modules = list(manifest.collect_plugin_modules('manifestplugins', recurse=True))
+        assert 'manifestplugins.gamma' in [module.__name__ for module in modules]
+
+
+def test_plan_plugin_load():
+    from acme.framework.factory import Factory
+
+    factory = 'from acme.framework.factory import Factory\n\nclass %s(Factory):\n    pass\n'
+    with _plugin_tree({
+        'plannedplugins/__init__.py': '',
+        'plannedplugins/alpha.py': '__plugin_requires__ = ["plannedplugins.gamma", "elsewhere.missing"]\n' +
+                                   factory % 'Alpha',
+        'plannedplugins/beta.py': '__plugin_priority__ = -1\n' + factory % 'Beta',
+        'plannedplugins/gamma.py': '__plugin_priority__ = 5\n' + factory % 'Gamma',
+        'plannedplugins/delta.py': '__plugin_requires__ = "plannedplugins.alpha"\n'
+                                   '__plugin_priority__ = -10\n' + factory % 'Delta',
+        'plannedplugins/epsilon.py': '',
+    }, forget=['plannedplugins']):
+        plan = plan_plugin_load('plannedplugins')
+        order = [handle.name.rpartition('.')[2] for handle in plan]
+        assert order.index('beta') < order.index('epsilon') < order.index('gamma')
+        assert order.index('gamma') < order.index('alpha') < order.index('delta')
+        assert order[0] == 'beta'
+        assert not any(handle.loaded for handle in plan)
+
+        levels = [sorted(handle.name.rpartition('.')[2] for handle in level) for level in plan.levels()]
+        assert levels == [['beta', 'epsilon', 'gamma'], ['alpha'], ['delta']]
+
+        classes = list(plan.collect_plugin_classes(subclasses_of=Factory, limit=1))
+        assert [cls.__name__ for cls in classes] == ['Beta']
+        assert 'plannedplugins.gamma' not in sys.modules
+
+        modules = [module.__name__ for module in plan.load(workers=3)]
+        assert sorted(modules[:3]) == ['plannedplugins.beta', 'plannedplugins.epsilon', 'plannedplugins.gamma']
+        assert modules[3:] == ['plannedplugins.alpha', 'plannedplugins.delta']
+
+
+def test_find_first_plugin_module():
+    with _plugin_tree({
+        'firstplugins/__init__.py': '',
+        'firstplugins/audio.py': 'def handle_png(data):\n    return data\n',
+        'firstplugins/image_gif.py': 'def handle_gif(data):\n    return data\n',
+        'firstplugins/image_jpeg.py': 'try:\n    import zlib\nexcept ImportError:\n    zlib = None\n'
+                                      'if zlib:\n    def handle_png(data):\n        return data\n',
+        'firstplugins/image_png.py': 'def handle_png(data):\n    return data\n',
+    }, forget=['firstplugins']) as root:
+        module = find_first_plugin_module('firstplugins', 'handle_png', name_pattern='*.image_*')
+        assert module.__name__ in ('firstplugins.image_jpeg', 'firstplugins.image_png')
+        assert 'firstplugins.audio' not in sys.modules
+        assert 'firstplugins.image_gif' not in sys.modules
+        assert len([name for name in sys.modules if name.startswith('firstplugins.image_')]) == 1
+
+        modules = list(collect_plugin_modules('firstplugins', ['handle_png'], static=True, limit=2))
+        assert len(modules) == 2
+        assert 'firstplugins.image_gif' not in sys.modules
+
+        filename = os.path.join(root, 'plugins.index')
+        index = PluginIndex(filename)
+        assert find_first_plugin_module('firstplugins', 'handle_png', index=index) is not None
+        assert os.path.exists(filename) and not index._dirty
+        assert len(PluginIndex(filename)._sources) > 0
+
+        assert find_first_plugin_module('firstplugins', 'handle_tiff') is None
+        assert 'firstplugins.image_gif' not in sys.modules
+
+
+def test_collect_plugin_records():
+    with _plugin_tree({
+        'recordplugins/__init__.py': '',
+        'recordplugins/alpha.py': 'def do(x):\n    return x\n',
+        'recordplugins/beta.py': 'def do(x):\n    return x\n',
+        'recordplugins/nested/__init__.py': '',
+        'recordplugins/nested/gamma.py': 'def do(x):\n    return x\n',
+    }, forget=['recordplugins']) as root:
+        records = dict((record.name, record) for record in collect_plugin_records('recordplugins', recurse=True))
+        assert sorted(records) == ['recordplugins.alpha', 'recordplugins.beta', 'recordplugins.nested',
+                                   'recordplugins.nested.gamma']
+        assert not any(name.startswith('recordplugins.') for name in sys.modules)
+
+        alpha, beta = records['recordplugins.alpha'], records['recordplugins.beta']
+        assert alpha.namespace is beta.namespace
+        assert alpha.directory is beta.directory
+        assert alpha.path == os.path.join(root, 'recordplugins', 'alpha.py')
+        assert records['recordplugins.nested'].is_package
+        assert records['recordplugins.nested'].path == os.path.join(root, 'recordplugins', 'nested', '__init__.py')
+        assert not hasattr(alpha, '__dict__')
+
+        assert records['recordplugins.nested.gamma'].load().do(3) == 3
+        assert alpha.handle().name == 'recordplugins.alpha'
+
+
+def test_plugin_scope():
+    with _plugin_tree({
+        'scopedplugins/__init__.py': '',
+        'scopedplugins/alpha.py': 'from scopedplugins.beta import helpers\n\nclass Alpha(object):\n    pass\n',
+        'scopedplugins/beta/__init__.py': '',
+        'scopedplugins/beta/helpers.py': 'TABLE = list(range(1000))\n',
+    }, forget=['scopedplugins']):
+        import scopedplugins
+
+        with PluginScope() as scope:
+            assert len(list(collect_plugin_modules('scopedplugins'))) == 2
+            handle = list(collect_plugin_handles('scopedplugins'))[0]
+            handle.load()
+            assert sorted(scope.modules) == ['scopedplugins.alpha', 'scopedplugins.beta', 'scopedplugins.beta.helpers']
+            assert handle.loaded
+
+        assert sorted(scope.report.unloaded) == ['scopedplugins.alpha', 'scopedplugins.beta',
+                                                 'scopedplugins.beta.helpers']
+        assert scope.report.alive == []
+        assert 'scopedplugins' in sys.modules
+        assert not any(name.startswith('scopedplugins.') for name in sys.modules)
+        assert not hasattr(scopedplugins, 'alpha')
+        assert not handle.loaded
+
+        with PluginScope() as scope:
+            alpha = list(collect_plugin_classes('scopedplugins'))
+        assert scope.report.alive == ['scopedplugins.alpha']
+        assert [cls.__name__ for cls in alpha] == ['Alpha']
+        assert 'scopedplugins.alpha' not in sys.modules
+
+    with _plugin_tree({
+        'scopedextras/__init__.py': '',
+        'scopedextras/alpha.py': 'class Alpha(object):\n    pass\n',
+    }, forget=['scopedextras']) as root:
+        filename = os.path.join(root, 'plugins.manifest')
+        build_plugin_manifest(filename, 'scopedextras')
+        del sys.modules['scopedextras.alpha']
+        manifest = PluginManifest(filename)
+
+        with PluginScope() as scope:
+            assert [cls.__name__ for cls in manifest.collect_plugin_classes('scopedextras')] == ['Alpha']
+        assert scope.report.unloaded == ['scopedextras.alpha']
+
+        with PluginScope() as scope:
+            assert PluginEntryPoint('alpha', 'scopedextras.alpha:Alpha', 'scoped').load().__name__ == 'Alpha'
+        assert scope.report.unloaded == ['scopedextras.alpha']
+
+
+def test_plugin_instance_cache():
+    from acme.framework.factory import Factory
+
+    plugin_classes = list(collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True))
+    cache = PluginInstanceCache(max_size=len(plugin_classes))
+
+    first = list(cache.instantiate_plugin_classes(plugin_classes, 2))
+    second = list(cache.instantiate_plugin_classes(plugin_classes, 2))
+    assert all(a is b for a, b in zip(first, second))
+    assert (cache.hits, cache.misses, cache.evictions) == (len(plugin_classes), len(plugin_classes), 0)
+
+    assert cache.get(plugin_classes[0], 3) is not first[0]
+    assert (len(cache), cache.evictions) == (len(plugin_classes), 1)
+    assert cache.get(plugin_classes[0], [2]) is not cache.get(plugin_classes[0], [2])
+
+    cache = PluginInstanceCache()
+    assert cache.get(plugin_classes[0], 1) is not cache.get(plugin_classes[0], True)
+    assert cache.get(plugin_classes[0], widget=1) is not cache.get(plugin_classes[0], widget=1.0)
+    assert cache.get(plugin_classes[0], widget=1) is cache.get(plugin_classes[0], widget=1)
+
+
+def test_plugin_instance_pool():
+    from acme.framework.factory import Factory
+
+    plugin_class = list(collect_plugin_classes('acme.plugins', subclasses_of=Factory, recurse=True))[0]
+    pool = PluginInstancePool(max_idle=1)
+
+    with pool.instance(plugin_class, 2) as first:
+        with pool.instance(plugin_class, 2) as second:
+            assert first is not second
+    assert (pool.hits, pool.misses, pool.evictions) == (0, 2, 1)
+
+    instance = pool.checkout(plugin_class, 2)
+    assert instance in (first, second)
+    assert pool.hits == 1
+    pool.checkin(instance)
+    try:
+        pool.checkin(instance)
+        assert False, 'an instance can only be returned once'
+    except ValueError:
+        pass
+
+
+def test_compile_plugin_dispatch():
+    with _plugin_tree({
+        'dispatchplugins/__init__.py': '',
+        'dispatchplugins/double.py': '__plugin_key__ = "double"\n\ndef do(x):\n    return 2 * x\n',
+        'dispatchplugins/square.py': '__plugin_key__ = ["square", "power"]\n\ndef do(x):\n    return x * x\n',
+        'dispatchplugins/other.py': 'def undo(x):\n    return x\n',
+    }, forget=['dispatchplugins']):
+        dispatch = compile_plugin_dispatch('dispatchplugins', 'do')
+        assert len(dispatch.callables('do')) == 2
+        assert sorted(dispatch.call_all('do', 3)) == [6, 9]
+        assert dispatch.call_first('do', 3) in (6, 9)
+        assert dispatch.call_keyed('do', 'power', 3) == 9
+        assert sorted(dispatch.keys('do')) == ['double', 'power', 'square']
+        assert [sorted(results) for results in dispatch.map_all('do', [1, 2])] == [[1, 2], [4, 4]]
+        assert dispatch.map_keyed('do', [('double', 5), ('square', 5)]) == [10, 25]
+        assert dispatch.call_all('undo', 1) == []
+        try:
+            dispatch.call_first('undo', 1)
+            assert False, 'no plugin was compiled for undo'
+        except KeyError:
+            pass
+
+
+def test_fan_out_plugin_method():
+    with _plugin_tree({
+        'fanoutplugins/__init__.py': '',
+        'fanoutplugins/double.py': 'def do(x):\n    return 2 * x\n',
+        'fanoutplugins/square.py': 'def do(x):\n    return x * x\n\n'
+                                   'def do_batch(xs):\n    return [x * x for x in xs]\n',
+        'fanoutplugins/picky.py': 'def do(x):\n    if x == 5:\n        raise ValueError(x)\n    return x\n',
+    }, forget=['fanoutplugins']):
+        consumed = []
+
+        def items():
+            for i in range(10):
+                consumed.append(i)
+                yield i
+
+        batches = fan_out_plugin_method('fanoutplugins', 'do', items(), chunk_size=3, workers=2, max_pending=1)
+        first = next(batches)
+        assert first.start == 0 and len(consumed) == 3
+
+        batches = [first] + list(batches)
+        assert [batch.start for batch in batches] == sorted(batch.start for batch in batches)
+        results = dict((name, []) for name in ('fanoutplugins.double', 'fanoutplugins.square'))
+        for batch in batches:
+            assert batch.seconds >= 0
+            if batch.name in results:
+                results[batch.name].extend(batch.results)
+        assert results['fanoutplugins.double'] == [2 * i for i in range(10)]
+        assert results['fanoutplugins.square'] == [i * i for i in range(10)]
+
+        picky = [batch for batch in batches if batch.name == 'fanoutplugins.picky']
+        assert [batch.start for batch in picky if batch.error is not None] == [3]
+        assert isinstance(picky[1].error, ValueError)
+        assert picky[2].results == [6, 7, 8]
+
+
+def test_collect_plugins_isolated():
+    from acme.framework.factory import Factory
+
+    with _plugin_tree({
+        'isolatedplugins/__init__.py': '',
+        'isolatedplugins/alpha.py': 'from acme.framework.factory import Factory\n\n'
+                                    'class Alpha(Factory):\n    pass\n',
+        'isolatedplugins/beta.py': 'import isolatedhelper\n\ndef do(i):\n    return i\n',
+        'isolatedhelper.py': 'TABLE = list(range(1000))\n',
+    }, forget=['isolatedplugins', 'isolatedhelper']) as root:
+        filename = os.path.join(root, 'plugins.manifest')
+
+        found = collect_plugins_isolated(['isolatedplugins', 'acme.plugins'], subclasses_of=Factory, recurse=True)
+        assert sorted(found) == ['acme.plugins', 'isolatedplugins']
+        assert found['isolatedplugins']['classes'] == ['isolatedplugins.alpha:Alpha']
+        assert ['isolatedplugins.beta', ['do']] in found['isolatedplugins']['modules']
+        assert len(found['acme.plugins']['classes']) == 2
+        assert not any(name.startswith('isolated') for name in sys.modules)
+
+        manifest = build_plugin_manifest(filename, 'isolatedplugins', subclasses_of=Factory, isolated=True)
+        assert not any(name.startswith('isolated') for name in sys.modules)
+        modules = list(manifest.collect_plugin_modules('isolatedplugins', methods=['do']))
+        assert [module.__name__ for module in modules] == ['isolatedplugins.beta']
+        assert 'isolatedplugins.alpha' not in sys.modules
+
+
+def test_shared_plugin_discovery():
+    import threading
+    from acme.framework.factory import Factory
+    from livetribe import plugins
+
+    walks = []
+    walk = plugins._walk_plugin_paths
+
+    def counted_walk(namespace, *args, **kwargs):
+        walks.append(namespace)
+        return walk(namespace, *args, **kwargs)
+
+    files = {'sharedplugins/__init__.py': ''}
+    for i in range(20):
+        files['sharedplugins/plugin%02d.py' % i] = ('import time\nfrom acme.framework.factory import Factory\n\n'
+                                                    'time.sleep(0.005)\n\n'
+                                                    'class Plugin%02d(Factory):\n    pass\n' % i)
+
+    with _plugin_tree(files, forget=['sharedplugins']):
+        plugins._walk_plugin_paths = counted_walk
+        try:
+            discovery = SharedPluginDiscovery()
+            barrier = threading.Barrier(32)
+            results, errors = [], []
+
+            def hammer(i):
+                try:
+                    barrier.wait()
+                    for _ in range(50):
+                        if i % 2:
+                            results.append(discovery.collect_plugin_classes('sharedplugins', Factory))
+                        else:
+                            results.append(discovery.collect_plugin_modules('acme.plugins', ['work'], recurse=True))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=hammer, args=(i, )) for i in range(32)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert errors == []
+            assert sorted(walks) == ['acme.plugins', 'sharedplugins']
+            classes = [result for result in results if result and isinstance(result[0], type)]
+            assert len(classes) == 16 * 50 and all(result is classes[0] for result in classes)
+            assert len(classes[0]) == 20
+
+            discovery.invalidate('sharedplugins')
+            assert discovery.collect_plugin_classes('sharedplugins', Factory) == classes[0]
+            assert sorted(walks) == ['acme.plugins', 'sharedplugins', 'sharedplugins']
+
+            def invalidating_walk(namespace, *args, **kwargs):
+                plugins._walk_plugin_paths = counted_walk
+                discovery.invalidate()
+                return counted_walk(namespace, *args, **kwargs)
+
+            discovery.invalidate()
+            del walks[:]
+            plugins._walk_plugin_paths = invalidating_walk
+            discovery.collect_plugin_classes('sharedplugins', Factory)
+            discovery.collect_plugin_classes('sharedplugins', Factory)
+            discovery.collect_plugin_classes('sharedplugins', Factory)
+            assert walks == ['sharedplugins', 'sharedplugins']
+
+            classes = results = None
+            discovery.invalidate()
+            _forget_modules('sharedplugins')
+            with PluginScope() as scope:
+                assert len(discovery.collect_plugin_classes('sharedplugins', Factory)) == 20
+            assert scope.report.alive == []
+            assert len(scope.report.unloaded) == 20
+            assert len(discovery.collect_plugin_classes('sharedplugins', Factory)) == 20
+            assert 'sharedplugins.plugin00' in sys.modules
+        finally:
+            plugins._walk_plugin_paths = walk